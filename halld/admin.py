@@ -21,6 +21,10 @@ class SourceAdmin(admin.ModelAdmin):
 class ChangesetAdmin(admin.ModelAdmin):
     pass
 
+class RegenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'state', 'requested_by', 'created', 'processed', 'total', 'modified']
+    list_filter = ['state']
+
 admin.site.register(models.ResourceType)
 admin.site.register(models.Resource, ResourceAdmin)
 admin.site.register(models.LinkType)
@@ -29,3 +33,4 @@ admin.site.register(models.SourceType)
 admin.site.register(models.Source, SourceAdmin)
 admin.site.register(models.Identifier, IdentifierAdmin)
 admin.site.register(models.Changeset, ChangesetAdmin)
+admin.site.register(models.RegenerationJob, RegenerationJobAdmin)
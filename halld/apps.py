@@ -49,4 +49,9 @@ class HALLDConfig(AppConfig, metaclass=abc.ABCMeta):
         assert len(set(t.name for t in type_definitions)) == len(type_definitions)
         return MappingProxyType({t.name: t for t in type_definitions})
 
-    jsonld_context = {}
\ No newline at end of file
+    jsonld_context = {}
+
+    # Change this whenever a change to your definitions would change the
+    # result of regenerating resources. It's included in each resource's input
+    # fingerprint, so resources won't be regenerated unnecessarily otherwise.
+    definitions_version = None
@@ -0,0 +1,74 @@
+"""
+Compares halld.pointer with jsonpointer for the lookups and sets that
+inferences make.
+
+    python -m halld.benchmarks.pointer
+"""
+
+import timeit
+
+import jsonpointer
+
+from ..pointer import Pointer, MISSING
+
+doc = {
+    '@source': {
+        'science': {'title': 'Python', 'name': {'en': 'Python', 'la': 'Pythonidae'},
+                    'eats': [{'href': '/snake/a'}, {'href': '/snake/b'}]},
+        'mythology': {'description': 'A serpent'},
+    },
+}
+
+# FirstOf probing, where most pointers miss
+probes = ['/@source/mythology/title', '/@source/mythology/name/en', '/@source/science/title']
+
+def jsonpointer_probe():
+    for path in probes:
+        try:
+            return jsonpointer.JsonPointer(path).get(doc)
+        except jsonpointer.JsonPointerException:
+            continue
+
+parsed_probes = list(map(jsonpointer.JsonPointer, probes))
+
+def jsonpointer_parsed_probe():
+    for pointer in parsed_probes:
+        try:
+            return pointer.get(doc)
+        except jsonpointer.JsonPointerException:
+            continue
+
+pointer_probes = list(map(Pointer, probes))
+
+def pointer_probe():
+    for pointer in pointer_probes:
+        value = pointer.resolve(doc)
+        if value is not MISSING:
+            return value
+
+def jsonpointer_set():
+    target = {}
+    pointer = jsonpointer.JsonPointer('/label/en')
+    try:
+        pointer.set(target, 'Python')
+    except jsonpointer.JsonPointerException:
+        for i in range(1, len(pointer.parts)):
+            subpointer = jsonpointer.JsonPointer.from_parts(pointer.parts[:i])
+            if not subpointer.get(target, None):
+                subpointer.set(target, {})
+        pointer.set(target, 'Python')
+
+def pointer_set():
+    Pointer('/label/en').set({}, 'Python')
+
+def main(number=100000):
+    for name, func in [('jsonpointer probe', jsonpointer_probe),
+                       ('jsonpointer probe (pre-parsed)', jsonpointer_parsed_probe),
+                       ('halld.pointer probe', pointer_probe),
+                       ('jsonpointer set with autovivify', jsonpointer_set),
+                       ('halld.pointer set with autovivify', pointer_set)]:
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print('{:36} {:8.3f} us/call'.format(name, seconds / number * 1e6))
+
+if __name__ == '__main__':
+    main()
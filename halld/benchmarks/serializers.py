@@ -0,0 +1,60 @@
+"""
+Compares the encoders in halld.util.serializers (and a compact stdlib
+encoder) on a resource list page of realistic HAL resources.
+
+    python -m halld.benchmarks.serializers
+"""
+
+import json
+import timeit
+
+import ujson
+
+from ..util.serializers import SERIALIZERS
+
+def make_resource(i):
+    href = 'http://example.org/snake/{:06d}'.format(i)
+    return {
+        '@id': 'http://id.example.org/snake/{:06d}'.format(i),
+        'title': 'Snake number {} — “quoted”, with a slash/in it'.format(i),
+        'identifier': {'snake': '{:06d}'.format(i), 'taxonId': str(100000 + i)},
+        'description': 'A fairly long description of a snake. ' * 8,
+        'tags': ['reptile', 'squamata', 'serpentes'],
+        '_extant': True,
+        '_meta': {'created': '2014-01-01T00:00:00+00:00',
+                  'modified': '2014-06-01T12:34:56.789012+00:00',
+                  'version': i % 17 + 1},
+        '_links': {
+            'self': {'href': href},
+            'eats': [{'href': 'http://example.org/snake/{:06d}'.format(j),
+                      'title': 'Snake number {}'.format(j)} for j in range(i, i + 5)],
+            'eatenBy': [{'href': 'http://example.org/snake/{:06d}'.format(j),
+                         'title': 'Snake number {}'.format(j)} for j in range(i + 5, i + 8)],
+            'findSource': {'href': href + '/source/{sourceName}', 'templated': True},
+            'sourceList': {'href': href + '/source'},
+        },
+    }
+
+page = {
+    '_links': {'first': {'href': '/snake?page=1'}, 'next': {'href': '/snake?page=2'}},
+    '_embedded': {'item': [make_resource(i) for i in range(100)]},
+    'firstPage': 1,
+    'lastPage': 100,
+    'itemCount': 10000,
+    'page': 1,
+}
+
+def stdlib_compact(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def main(number=50):
+    encoders = dict(SERIALIZERS, **{'stdlib compact': stdlib_compact})
+    for name, encoder in sorted(encoders.items()):
+        assert json.loads(encoder(page)) == json.loads(json.dumps(page))
+        seconds = min(timeit.repeat(lambda: encoder(page), number=number, repeat=3))
+        size = len(encoder(page).encode('utf-8'))
+        print('{:16} {:8.3f} ms/page {:8d} bytes'.format(name, seconds / number * 1e3, size))
+    print('(ujson {})'.format(ujson.__version__))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Running regenerate-all jobs.
+
+A job walks every resource in href order, regenerating chunk_size of them
+in each transaction. The href of the last resource in a chunk is committed
+along with it, so an interrupted job resumes from the following chunk.
+Between chunks the job is re-read, so that it can be paused or cancelled
+(and its chunk_size or delay changed) while it runs.
+"""
+
+import logging
+import time
+
+from django.db import transaction
+
+from .. import models
+from ..util import locking
+from ..util.cache import ObjectCache
+from .updater import SourceUpdater
+
+logger = logging.getLogger(__name__)
+
+class RegenerationJobRunner(object):
+    def __init__(self, job, regeneration_mode=None, regeneration_workers=None):
+        self.job = job
+        self.regeneration_mode = regeneration_mode
+        self.regeneration_workers = regeneration_workers
+
+    def run(self):
+        """
+        Runs the job until it finishes, or until it stops being runnable.
+        """
+        if not self.start():
+            return self.job
+        logger.info("Running regeneration job %d from %r", self.job.pk, self.job.last_href)
+        try:
+            while self.run_chunk():
+                if self.job.delay:
+                    time.sleep(self.job.delay)
+        except Exception as e:
+            logger.exception("Regeneration job %d failed after %d resources",
+                             self.job.pk, self.job.processed)
+            models.RegenerationJob.objects.filter(pk=self.job.pk).update(state='failed',
+                                                                        error=str(e))
+            raise
+        return self.job
+
+    def start(self):
+        with transaction.atomic():
+            job = models.RegenerationJob.objects.select_for_update().get(pk=self.job.pk)
+            if not job.is_active:
+                self.job = job
+                return False
+            if job.state == 'pending':
+                job.state = 'running'
+                job.started = job.started or models.now()
+                job.total = models.Resource.objects.count()
+                job.save()
+            self.job = job
+        return True
+
+    def run_chunk(self):
+        """
+        Regenerates the next chunk of resources, returning False if there's
+        nothing more to do.
+        """
+        with transaction.atomic():
+            job = models.RegenerationJob.objects.select_for_update().get(pk=self.job.pk)
+            if job.state != 'running' or job.last_href != self.job.last_href:
+                # Paused or cancelled, or another runner has got there first
+                self.job = job
+                return False
+            hrefs = list(models.Resource.objects.filter(href__gt=job.last_href)
+                                                .order_by('href')
+                                                .values_list('href', flat=True)[:job.chunk_size])
+            resources = locking.lock_rows(models.Resource.objects.filter(href__in=hrefs),
+                                          SourceUpdater.use_advisory_locks)
+            if not hrefs:
+                job.state = 'finished'
+                job.finished = models.now()
+                job.save()
+                self.job = job
+                logger.info("Regeneration job %d finished; %d of %d resources modified",
+                            job.pk, job.modified, job.processed)
+                return False
+
+            updater = SourceUpdater('', job.requested_by,
+                                    object_cache=ObjectCache(job.requested_by),
+                                    regeneration_mode=self.regeneration_mode,
+                                    regeneration_workers=self.regeneration_workers)
+            modified_resources = updater.regenerate_chunk(resources)
+
+            job.last_href = hrefs[-1]
+            job.processed += len(hrefs)
+            job.modified += len(modified_resources)
+            job.save()
+            self.job = job
+        logger.debug("Regeneration job %d: %d of %s resources processed",
+                     job.pk, job.processed, job.total)
+        return True
@@ -0,0 +1,80 @@
+"""
+Link maintenance for a changeset.
+
+Rather than rewriting the Link rows for each resource as it's regenerated,
+the links each regenerated resource should have are held here until the
+changeset's resources are saved, and then written in one go. Until then,
+inbound links are worked out from the stored links, overlaid with the ones
+pending here.
+"""
+
+import collections
+
+from .. import models
+
+class PendingLinks(object):
+    def __init__(self):
+        # source href -> {(target_href, link_type_name), ...}
+        self.outbound = {}
+        # target href -> {(source_href, link_type_name), ...}
+        self.inbound = collections.defaultdict(set)
+
+    def __bool__(self):
+        return bool(self.outbound)
+
+    def set_links(self, resource):
+        """
+        Records the links resource should have, given its current data.
+        """
+        for target_href, type_name in self.outbound.get(resource.href, ()):
+            self.inbound[target_href].discard((resource.href, type_name))
+        self.outbound[resource.href] = links = resource.get_outbound_links()
+        for target_href, type_name in links:
+            self.inbound[target_href].add((resource.href, type_name))
+
+    def get_inbound_links(self, target_hrefs):
+        """
+        Returns a dict from each of target_hrefs to a list of the Link objects
+        that would point at it were the pending links saved. Pending links
+        are unsaved Link objects.
+        """
+        target_hrefs = set(target_hrefs)
+        inbound_links = {href: [] for href in target_hrefs}
+        for link in models.Link.objects.filter(target_href__in=target_hrefs):
+            if link.source_id not in self.outbound:
+                inbound_links[link.target_href].append(link)
+        for target_href in target_hrefs:
+            for source_href, type_name in sorted(self.inbound.get(target_href, ())):
+                inbound_links[target_href].append(models.Link(source_id=source_href,
+                                                              target_href=target_href,
+                                                              type_id=type_name))
+        return inbound_links
+
+    def get_links_among(self, hrefs):
+        """
+        Returns (source_href, target_href) pairs for the links between the
+        given resources, were the pending links saved.
+        """
+        hrefs = set(hrefs)
+        pairs = set()
+        links = models.Link.objects.filter(source_id__in=hrefs, target_href__in=hrefs)
+        for source_href, target_href in links.values_list('source_id', 'target_href'):
+            if source_href not in self.outbound:
+                pairs.add((source_href, target_href))
+        for source_href, links in self.outbound.items():
+            if source_href in hrefs:
+                pairs.update((source_href, target_href) for target_href, type_name in links
+                                                        if target_href in hrefs)
+        return pairs
+
+    def save(self):
+        """
+        Writes the pending links, returning the number of rows deleted and
+        created.
+        """
+        if not self.outbound:
+            return 0, 0
+        result = models.Link.sync(self.outbound)
+        self.outbound.clear()
+        self.inbound.clear()
+        return result
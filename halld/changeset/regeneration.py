@@ -0,0 +1,202 @@
+"""
+Engines for computing regenerated resource data.
+
+Each engine takes a list of ``(resource, prefetched_data)`` pairs and returns
+the result of ``resource.collect_data()`` for each, in the same order. They
+only compute data; merging the results back (denormalized fields, cascade
+sets, identifier and link updates) is left to the caller, so that it happens
+in a deterministic order whichever engine is in use.
+
+Parallel engines expect everything a regeneration needs (source sets,
+inbound links, identifiers) to have been prefetched. Worker threads and
+processes would use their own database connections, which aren't party to
+the changeset's transaction, so they're given read-only snapshots of the
+prefetched identifiers and object cache. A chunk that needs something
+missing from those is collected again in the calling thread. Resources
+whose inferences read linked resources, other than by looking up their
+identifiers, are always collected there.
+"""
+
+import abc
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+
+from django.db import connection, connections
+
+from .. import models
+from ..util.cache import ObjectCache, PrefetchMiss
+
+logger = logging.getLogger(__name__)
+
+class Regenerator(object, metaclass=abc.ABCMeta):
+    def __init__(self, workers=None):
+        self.workers = workers or multiprocessing.cpu_count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def collect(self, jobs, object_cache):
+        pass
+
+class SerialRegenerator(Regenerator):
+    def __init__(self, workers=None):
+        super().__init__(1)
+
+    def collect(self, jobs, object_cache):
+        return _collect_chunk(jobs, object_cache)
+
+class PoolRegenerator(Regenerator):
+    """
+    Splits each batch into contiguous chunks, one per worker.
+
+    Batches with fewer than min_batch_size resources that can be collected
+    in parallel are collected serially, as it isn't worth the overhead of
+    handing them out.
+    """
+    executor_class = None
+    min_batch_size = 50
+
+    def __init__(self, workers=None):
+        super().__init__(workers)
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = self.executor_class(max_workers=self.workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def collect(self, jobs, object_cache):
+        # Resources whose inferences read linked resources fetch them through
+        # the object cache as they go, so are collected here, where that can
+        # happen within the changeset's transaction. Those that only look up
+        # identifiers can use the prefetched ones.
+        parallel = [i for i, job in enumerate(jobs) if _can_collect_in_parallel(*job)]
+        if self.workers == 1 or len(parallel) < self.min_batch_size:
+            return _collect_chunk(jobs, object_cache)
+        snapshot_jobs = _snapshot_jobs([jobs[i] for i in parallel])
+        snapshot_object_cache = object_cache.snapshot()
+        chunk_size = -(-len(parallel) // self.workers)
+        chunks = [(parallel[i:i+chunk_size], snapshot_jobs[i:i+chunk_size])
+                  for i in range(0, len(parallel), chunk_size)]
+        futures = [self.submit_chunk(chunk, snapshot_object_cache) for _, chunk in chunks]
+        logger.debug("Regenerating %d resources in %d chunks, and %d serially",
+                     len(parallel), len(futures), len(jobs) - len(parallel))
+
+        results = [None] * len(jobs)
+        for i in sorted(set(range(len(jobs))) - set(parallel)):
+            results[i] = _collect_chunk([jobs[i]], object_cache)[0]
+        for (indices, _), future in zip(chunks, futures):
+            try:
+                chunk_results = future.result()
+            except PrefetchMiss as e:
+                logger.debug("Regenerating chunk serially, as it needed something not prefetched: %s", e)
+                chunk_results = _collect_chunk([jobs[i] for i in indices], object_cache)
+            for i, data in zip(indices, chunk_results):
+                results[i] = data
+        return results
+
+    @abc.abstractmethod
+    def submit_chunk(self, chunk, object_cache):
+        pass
+
+class ThreadRegenerator(PoolRegenerator):
+    """
+    Only worth using where inferences spend most of their time outside the
+    GIL.
+    """
+    executor_class = concurrent.futures.ThreadPoolExecutor
+
+    def submit_chunk(self, chunk, object_cache):
+        return self.executor.submit(_collect_chunk_in_thread, chunk, object_cache)
+
+class ProcessRegenerator(PoolRegenerator):
+    """
+    Resources and their prefetched data are pickled across to the worker
+    processes, which get an empty read-only ObjectCache.
+    """
+    executor_class = concurrent.futures.ProcessPoolExecutor
+
+    def submit_chunk(self, chunk, object_cache):
+        # The object cache snapshot would be pickled for every chunk, so each
+        # worker gets an empty one.
+        return self.executor.submit(_collect_chunk_in_process, chunk, ObjectCache(None).snapshot())
+
+class IdentifierSnapshot(dict):
+    """
+    A read-only copy of an updater's IdentifierCache, which raises
+    PrefetchMiss instead of querying for identifiers it doesn't have.
+    """
+    def __init__(self, identifiers):
+        super().__init__(identifiers)
+        self.missing = frozenset(getattr(identifiers, 'missing', ()))
+
+    def __missing__(self, key):
+        if key in self.missing:
+            raise models.Identifier.DoesNotExist
+        raise PrefetchMiss('Identifier', [key])
+
+def _can_collect_in_parallel(resource, prefetched_data):
+    plan = resource.get_plan()
+    if plan.lookups and 'identifiers' not in prefetched_data:
+        return False
+    return not plan.reads_linked_data
+
+def _snapshot_jobs(jobs):
+    """
+    Returns jobs with read-only snapshots of any prefetched identifiers,
+    which are otherwise shared with (and updated by) the caller.
+    """
+    snapshots, snapshot_jobs = {}, []
+    for resource, prefetched_data in jobs:
+        identifiers = prefetched_data.get('identifiers')
+        if identifiers is not None:
+            if id(identifiers) not in snapshots:
+                snapshots[id(identifiers)] = IdentifierSnapshot(identifiers)
+            prefetched_data = dict(prefetched_data, identifiers=snapshots[id(identifiers)])
+        snapshot_jobs.append((resource, prefetched_data))
+    return snapshot_jobs
+
+def _collect_chunk(jobs, object_cache):
+    return [resource.collect_data(object_cache, prefetched_data)
+            for resource, prefetched_data in jobs]
+
+def _collect_chunk_in_thread(jobs, object_cache):
+    try:
+        return _collect_chunk(jobs, object_cache)
+    finally:
+        # Each thread gets its own connection, which would otherwise be left
+        # open once the thread has gone away.
+        connection.close()
+
+_connections_pid = os.getpid()
+
+def _collect_chunk_in_process(jobs, object_cache):
+    global _connections_pid
+    if _connections_pid != os.getpid():
+        # A forked worker inherits the parent's connections. Forget them
+        # without closing them, as they still belong to the parent.
+        for conn in connections.all():
+            conn.connection = None
+        _connections_pid = os.getpid()
+    return _collect_chunk(jobs, object_cache)
+
+regenerators = {
+    'serial': SerialRegenerator,
+    'thread': ThreadRegenerator,
+    'process': ProcessRegenerator,
+}
@@ -0,0 +1,139 @@
+"""
+Ordering cascading regenerations.
+
+Regenerating a resource can change what's inbound to the resources it
+links to, and (for resources whose inferences look at linked resources)
+what they see of it. Rather than regenerating everything awaiting
+regeneration in passes, the scheduler regenerates each resource after those
+it depends on, so that it's regenerated once with their final state.
+Resources that depend on each other are regenerated together, and again
+until they stop changing.
+"""
+
+import collections
+
+def strongly_connected_components(nodes, graph):
+    """
+    Returns the strongly connected components of graph (a dict from each of
+    nodes to the set of nodes it has edges to), as lists, using Tarjan's
+    algorithm. Components are returned in reverse topological order, with
+    their members sorted.
+    """
+    index, lowlink, on_stack = {}, {}, set()
+    stack, components = [], []
+    for root in nodes:
+        if root in index:
+            continue
+        # Iterative, to cope with long chains
+        work = [(root, iter(sorted(graph[root])))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(sorted(graph[child]))))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+    return components
+
+class CascadeScheduler(object):
+    def __init__(self, pending_links, max_regenerations):
+        self.pending_links = pending_links
+        self.max_regenerations = max_regenerations
+        # href -> resource, for those awaiting regeneration
+        self.dirty = {}
+        self.regenerations = collections.Counter()
+        self.dropped = set()
+        self.rounds = 0
+        # Number of times a resource was held back until those it depends on
+        # had been regenerated
+        self.deferred = 0
+        # Number of groups of mutually-dependent resources regenerated
+        self.cycles = 0
+
+    def __bool__(self):
+        return bool(self.dirty)
+
+    def add(self, resources):
+        """
+        Marks resources as needing regeneration. Their source sets should
+        already be cached.
+        """
+        for resource in resources:
+            if self.regenerations[resource.href] >= self.max_regenerations:
+                self.dropped.add(resource.href)
+            else:
+                self.dirty[resource.href] = resource
+
+    def next_batch(self):
+        """
+        Returns the resources to regenerate next, sorted by href. These are
+        the ones that don't depend on anything else awaiting regeneration,
+        along with any groups of resources that only depend on each other.
+        """
+        hrefs = sorted(self.dirty)
+        graph = self.get_dependency_graph(hrefs)
+        components = strongly_connected_components(hrefs, graph)
+        component_of = {href: i for i, component in enumerate(components) for href in component}
+        blocked = {component_of[target]
+                   for href, targets in graph.items()
+                   for target in targets
+                   if component_of[href] != component_of[target]}
+        batch = []
+        for i, component in enumerate(components):
+            if i in blocked:
+                self.deferred += len(component)
+                continue
+            if len(component) > 1:
+                self.cycles += 1
+            batch.extend(component)
+        batch.sort()
+        self.rounds += 1
+        self.regenerations.update(batch)
+        return [self.dirty.pop(href) for href in batch]
+
+    def get_dependency_graph(self, hrefs):
+        """
+        Returns a dict from each of hrefs to the set of hrefs that should be
+        regenerated after it.
+        """
+        graph = {href: set() for href in hrefs}
+        for source_href, target_href in self.pending_links.get_links_among(hrefs):
+            if source_href == target_href:
+                continue
+            # What's inbound to the target depends on the source
+            graph[source_href].add(target_href)
+            if self.dirty[source_href].get_plan().reads_linked_resources:
+                graph[target_href].add(source_href)
+        return graph
+
+    @property
+    def stats(self):
+        return {
+            'rounds': self.rounds,
+            'resources': len(self.regenerations),
+            'regenerations': sum(self.regenerations.values()),
+            'deferred': self.deferred,
+            'cycles': self.cycles,
+            'dropped': len(self.dropped),
+        }
@@ -2,34 +2,73 @@ import abc
 import collections
 import contextlib
 import functools
+import itertools
 import logging
+import random
 import re
+import time
 from urllib.parse import urljoin
 
-from django.db import IntegrityError, OperationalError, transaction
+from django.db import OperationalError, transaction
 import jsonschema
 
 from .schema import schema
-from . import methods
+from . import links, methods, scheduling
+from .regeneration import regenerators
+from ..util import bulk, locking
 from ..util.cache import ObjectCache
 from .. import exceptions
 from .. import models
+from .. import signals
 from .. import get_halld_config
+from .. import conf
 
 logger = logging.getLogger(__name__)
 
 class IdentifierCache(collections.defaultdict):
+    # Maximum number of values to look up in one query
+    prefetch_batch_size = 1000
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.reverse = collections.defaultdict(set)
+        # Keys we've prefetched and know not to exist
+        self.missing = set()
 
     def __missing__(self, key):
+        if key in self.missing:
+            raise models.Identifier.DoesNotExist
         resource = models.Identifier.objects.select_related('resource').get(scheme=key[0], value=key[1]).resource.href
         self[key] = resource
         return resource
     def __setitem__(self, key, value):
+        self.missing.discard(key)
         self.reverse[value].add(key)
         super().__setitem__(key, value)
+
+    def prefetch(self, keys):
+        """
+        Looks up the given (scheme, value) pairs with one query per scheme
+        (per prefetch_batch_size values), so that later lookups don't need
+        to query one at a time.
+        """
+        values_by_scheme = collections.defaultdict(dict)
+        for key in keys:
+            scheme, value = key
+            if not isinstance(value, (str, int, float)) or key in self or key in self.missing:
+                continue
+            # Values are stored as strings, but may be looked up as numbers
+            values_by_scheme[scheme].setdefault(str(value), set()).add(key)
+        for scheme, values in values_by_scheme.items():
+            values = sorted(values.items())
+            for i in range(0, len(values), self.prefetch_batch_size):
+                batch = dict(values[i:i+self.prefetch_batch_size])
+                found = models.Identifier.objects.filter(scheme=scheme, value__in=list(batch))
+                for value, resource_href in found.values_list('value', 'resource_id'):
+                    for key in batch.pop(value, ()):
+                        self[key] = resource_href
+                for missing_keys in batch.values():
+                    self.missing.update(missing_keys)
     def __delitem__(self, key):
         self.reverse[self[key]].remove(key)
         super().__delitem__(key)
@@ -42,21 +81,41 @@ class SourceUpdater(object):
         'PATCH': methods.PatchUpdate,
         'MOVE': methods.MoveUpdate,
     }
+    # The most times any one resource is regenerated in a changeset, should
+    # resources that depend on each other not settle down.
     max_cascades = 10
 
+    # Deadlocked regenerations are retried up to max_lock_retries times,
+    # with jittered exponential backoff starting at lock_retry_delay seconds.
+    max_lock_retries = 5
+    lock_retry_delay = 0.05
+    lock_retry_max_delay = 2
+    use_advisory_locks = conf.REGENERATION_ADVISORY_LOCKS
+    regenerators = regenerators
+
     source_href_re = re.compile(r'^(?P<source_href>(?P<resource_href>(?P<resource_type_href>.+)/(?P<identifier>[a-z\-\d]+))/source/(?P<source_type>[a-z\i\d:\-]+))$')
 
 
     def __init__(self, base_href, author, committer=None, multiple=False,
-                 object_cache=None):
+                 object_cache=None, regeneration_mode=None, regeneration_workers=None):
         self.base_href = base_href
         self.author = author
         self.committer = committer or author
         self.multiple = multiple
         self.object_cache = object_cache or ObjectCache(self.committer)
+        self.regeneration_mode = regeneration_mode or conf.REGENERATION_MODE
+        self.regeneration_workers = regeneration_workers or conf.REGENERATION_WORKERS
+        self.regeneration_job = None
+        # Number of times regeneration has been retried after a deadlock
+        self.lock_retries = 0
+        self.pending_links = links.PendingLinks()
+        # Number of linked resources not regenerated because nothing they
+        # look at changed
+        self.cascades_avoided = 0
+        self.cascade_stats = {}
 
     @contextlib.contextmanager
-    def save_wrapper(self, errors, error_handling, with_transaction=None):
+    def save_wrapper(self, errors, error_handling, with_transaction=None, update=None):
         try:
             if with_transaction != True and (with_transaction == False or error_handling == 'fail-first'):
                 yield
@@ -64,6 +123,8 @@ class SourceUpdater(object):
                 with transaction.atomic():
                     yield
         except exceptions.HALLDException as error:
+            if update is not None:
+                error.update_id = update.get('id')
             if not self.multiple:
                 raise
             errors.append(error)
@@ -83,7 +144,7 @@ class SourceUpdater(object):
         elif data.get('regenerateAll'):
             logger.info("Regenerating all for user %s", self.committer.username)
 
-        error_handling = data.get('error-handling', "fail-first")
+        error_handling = data.get('errorHandling', "fail-first")
         errors = []
         save_wrapper = functools.partial(self.save_wrapper, errors, error_handling)
 
@@ -91,31 +152,62 @@ class SourceUpdater(object):
         # This locks the sources for update, blocking if necessary.
         sources = self.get_sources_to_update(updates)
         modified_sources = self.update_sources(updates, sources, save_wrapper)
+        if errors and error_handling != 'ignore':
+            # 'try-all' has now tried everything, and won't apply anything.
+            raise exceptions.MultipleErrors(errors)
         self.save_sources(modified_sources, save_wrapper)
 
         # Here we regenerate all the resources for the sources we've changed.
         # These regenerations might cascade to other resources that we didn't
         # already know about. Those resources may already be locked for update
-        # by another request, which may deadlock causing an OperationalError.
-        # In that case we back off and attempt the regeneration from scratch.
-        while True:
+        # by another request. Resources are always locked in href order, but
+        # the cascades of two changesets may still overlap in conflicting
+        # order, causing a deadlock and an OperationalError. In that case we
+        # back off and attempt the regeneration from scratch.
+        for attempt in itertools.count():
             try:
                 with transaction.atomic():
-                    resources = self.get_initial_resources(updates, data.get('regenerateAll'),
-                                                           select_for_update=True)
+                    resources = self.get_initial_resources(updates, select_for_update=True)
                     self.update_cached_source_sets(resources)
                     modified_resources = self.regenerate_resources(resources)
             except OperationalError:
+                if attempt >= self.max_lock_retries:
+                    raise
+                self.back_off(attempt)
                 continue
             break
+        self.cascade_stats['lock_retries'] = self.lock_retries
+        if self.lock_retries:
+            logger.warning("Regeneration for user %s needed %d retries to acquire locks",
+                           self.committer.username, self.lock_retries)
 
         self.save_resources(modified_resources, save_wrapper)
 
+        # Regenerating everything in this transaction would lock every
+        # resource for as long as it took, so it's left to a job that does it
+        # a chunk at a time.
+        if data.get('regenerateAll'):
+            self.regeneration_job = models.RegenerationJob.enqueue(self.committer)
+
         if errors:
-            if self.error_handling == 'ignore':
-                raise exceptions.MultipleErrors(errors)
-            else:
+            if error_handling == 'ignore':
                 return exceptions.MultipleErrors(errors)
+            else:
+                raise exceptions.MultipleErrors(errors)
+
+    def back_off(self, attempt):
+        """
+        Waits a random time, up to an exponentially-increasing maximum,
+        before a regeneration is retried. Resources regenerated in the failed
+        attempt are forgotten, as they will have been modified in memory.
+        """
+        self.lock_retries += 1
+        delay = random.uniform(0, min(self.lock_retry_max_delay,
+                                      self.lock_retry_delay * 2 ** attempt))
+        logger.info("Regeneration for user %s failed to acquire locks; retry %d in %.3fs",
+                    self.committer.username, attempt + 1, delay)
+        self.object_cache.resource.objs.clear()
+        time.sleep(delay)
 
     def get_updates(self, data):
         """
@@ -132,6 +224,7 @@ class SourceUpdater(object):
                 match = self.source_href_re.match(update['href'])
                 if not match:
                     bad_hrefs.add(update['href'])
+                    continue
                 update['resourceHref'] = match.group('resource_href')
                 update['sourceType'] = match.group('source_type')
             else:
@@ -147,23 +240,37 @@ class SourceUpdater(object):
 
         return updates
 
-    def get_initial_resources(self, updates, regenerate_all, select_for_update):
+    def get_initial_resources(self, updates, select_for_update):
         resource_hrefs = set(update['resourceHref'] for update in updates)
         resource_hrefs.update(update['targetResourceHref'] for update in updates if update['method'] == 'MOVE')
-        if regenerate_all:
-            resources = models.Resource.objects.all()
-        else:
-            resources = models.Resource.objects.filter(pk__in=resource_hrefs)
+        resources = models.Resource.objects.filter(pk__in=resource_hrefs)
         if select_for_update:
-            resources = resources.select_for_update()
-        resources = list(resources)
+            resources = locking.lock_rows(resources, self.use_advisory_locks)
+        else:
+            resources = list(resources)
         self.object_cache.resource.add_many(resources)
         resources = {r.href: r for r in resources}
         return resources
 
+    def regenerate_chunk(self, resources):
+        """
+        Regenerates and saves the given resources, and any they cascade to,
+        regardless of whether their inputs have changed. Used by
+        regenerate-all jobs; the caller is responsible for locking the
+        resources.
+        """
+        resources = {r.href: r for r in resources}
+        self.object_cache.resource.add_many(resources.values())
+        self.update_cached_source_sets(resources)
+        modified_resources = self.regenerate_resources(resources, use_fingerprints=False)
+        self.save_resources(modified_resources,
+                            functools.partial(self.save_wrapper, [], 'fail-first'))
+        return modified_resources
+
     def get_sources_to_update(self, updates):
         source_hrefs = set(update['href'] for update in updates)
-        sources = {s.href: s for s in models.Source.objects.select_for_update().filter(href__in=source_hrefs)}
+        sources = models.Source.objects.filter(href__in=source_hrefs)
+        sources = {s.href: s for s in locking.lock_rows(sources)}
         return sources
 
     def update_sources(self, updates, sources, save_wrapper):
@@ -174,48 +281,68 @@ class SourceUpdater(object):
         if missing_hrefs:
             raise exceptions.SourceDataWithoutResource(missing_hrefs)
 
-        results = collections.defaultdict(set)
         modified_sources = set()
         for i, update in enumerate(updates, 1):
             if i % 100 == 0:
                 logger.debug("Updating source %d of %d for user %s",
                              i, len(updates), self.committer.username)
-            try:
-                method = self.methods[update['method']].from_json(update)
-            except KeyError as e:
-                raise exceptions.MethodNotAllowed(update['method'], bad_request=True) from e
-            try:
-                source = sources[update['href']]
-            except KeyError as e:
-                # No need to create sources that would be deleted anyway
-                if method.will_delete:
-                    continue
-                if method.require_source_exists:
-                    raise exceptions.NoSuchSource(update['href']) from e
-                resource_type = resource_types[update['resourceHref']]
-                if update['sourceType'] not in resource_type.source_types:
-                    with save_wrapper(with_transaction=False):
-                        raise exceptions.IncompatibleSourceType(resource_type.name,
-                                                                update['sourceType']) from e
-                    continue
-                source = models.Source(resource_id=update['resourceHref'],
-                                       type_id=update['sourceType'])
-                sources[update['href']] = source
-            result = method(self.author, self.committer, source)
-            if result:
-                source.author = self.author
-                source.committer = self.committer
-                modified_sources.add(source)
-            results[result].add(source)
+            with save_wrapper(with_transaction=False, update=update):
+                source = self.update_source(update, sources, resource_types)
+                if source:
+                    modified_sources.add(source)
         return modified_sources
 
+    def update_source(self, update, sources, resource_types):
+        """
+        Applies a single update, returning the source if it was modified.
+        """
+        try:
+            method = self.methods[update['method']].from_json(update)
+        except KeyError as e:
+            raise exceptions.MethodNotAllowed(update['method'], bad_request=True) from e
+        try:
+            source = sources[update['href']]
+        except KeyError as e:
+            # No need to create sources that would be deleted anyway
+            if method.will_delete:
+                return
+            if method.require_source_exists:
+                raise exceptions.NoSuchSource(update['href']) from e
+            resource_type = resource_types[update['resourceHref']]
+            if update['sourceType'] not in resource_type.source_types:
+                raise exceptions.IncompatibleSourceType(resource_type.name,
+                                                        update['sourceType']) from e
+            source = models.Source(resource_id=update['resourceHref'],
+                                   type_id=update['sourceType'])
+            sources[update['href']] = source
+        if method(self.author, self.committer, source):
+            source.author = self.author
+            source.committer = self.committer
+            return source
+
     def save_sources(self, sources, save_wrapper):
-        for i, source in enumerate(sources, 1):
-            if i % 100 == 0:
-                logger.debug("Saving source %d of %d for user %s",
-                             i, len(sources), self.committer.username)
-            with save_wrapper():
-                source.save(cascade_to_resource=False)
+        """
+        Writes modified sources with one bulk INSERT and as few UPDATEs as
+        possible, sending their signals once the changeset has been committed.
+        """
+        timestamp = models.now()
+        sources_to_create, sources_to_update, pending_signals = [], [], []
+        for source in sorted(sources, key=lambda s: (s.resource_id, s.type_id)):
+            created, pending_signal = source.prepare_save(timestamp)
+            if created:
+                sources_to_create.append(source)
+            elif pending_signal or source.is_stale:
+                sources_to_update.append(source)
+            if pending_signal:
+                pending_signals.append(pending_signal)
+        logger.debug("Saving %d new and %d existing sources for user %s",
+                     len(sources_to_create), len(sources_to_update), self.committer.username)
+        with save_wrapper():
+            models.Source.objects.bulk_create(sources_to_create)
+            bulk.bulk_update(sources_to_update)
+        for source in sources_to_create + sources_to_update:
+            bulk.mark_saved(source)
+        signals.send_after_commit(pending_signals)
 
     def update_cached_source_sets(self, resources):
         sources_by_resource = collections.defaultdict(set)
@@ -224,78 +351,167 @@ class SourceUpdater(object):
         for href, sources in sources_by_resource.items():
             resources[href].cached_source_set = sources
 
-    def regenerate_resources(self, resources):
-        modified_resources = set()
+    def prefetch_source_sets(self, resources):
+        """
+        Fills in cached_source_set for resources that don't have one yet, so
+        that regeneration doesn't need to query for them one at a time.
+        """
+        resources = {r.href: r for r in resources
+                               if getattr(r, '_cached_source_set', None) is None}
+        if not resources:
+            return
+        sources_by_resource = collections.defaultdict(list)
+        for source in models.Source.objects.filter(resource__in=set(resources), deleted=False):
+            sources_by_resource[source.resource_id].append(source)
+        for href, resource in resources.items():
+            resource.cached_source_set = sources_by_resource[href]
+
+    def get_regenerator(self):
+        return self.regenerators[self.regeneration_mode](self.regeneration_workers)
+
+    def regenerate_resources(self, resources, use_fingerprints=True):
+        """
+        Regenerates resources, cascading to linked resources until nothing
+        changes. Resources whose links to a regenerated resource haven't
+        changed are only cascaded to if their inferences look at linked
+        resources.
+
+        Each round regenerates those awaiting regeneration that don't depend
+        on others also awaiting it (see scheduling.CascadeScheduler), so a
+        resource is usually regenerated once, after whatever it depends on.
+
+        Resources whose input fingerprint hasn't changed since they were last
+        regenerated are skipped, unless use_fingerprints is False.
+        """
+        modified_resources, refingerprinted_resources = set(), set()
         identifier_cache = IdentifierCache()
-        resources_to_save = set(resources.values())
-        for i in range(1, self.max_cascades + 1):
-            logger.debug("Cascade %d: %d resources to save",
-                             i, len(resources_to_save))
-            cascade_set = set()
-            changed = 0
-
-            inbound_links = collections.defaultdict(list)
-            for link in models.Link.objects.filter(target_href__in=[r.href for r in resources_to_save]):
-                inbound_links[link.target_href].append(link)
-
-            for j, resource in enumerate(resources_to_save, 1):
-                if j % 100 == 0:
-                    logger.debug("Regenerating resource %d of %d for user %s (%d changed, %d cascades)",
-                                 j, len(resources_to_save), self.committer.username,
-                                 changed,
-                                 len(cascade_set))
-                if resource.regenerate(cascade_set,
-                                       self.object_cache,
-                                       prefetched_data={'inbound_links': inbound_links[resource.href],
-                                                        'identifiers': identifier_cache}):
-                    identifiers_to_drop = set(identifier_cache.reverse[resource.href])
-                    changed += 1
-                    for k in identifiers_to_drop:
-                        del identifier_cache[k]
-                    for k, v in resource.identifier_data:
-                        identifier_cache[(k, v)] = resource.href
-                    resource.update_links()
-                    modified_resources.add(resource)
-            if not cascade_set:
-                break
-            new_resources = models.Resource.objects.select_for_update().filter(href__in=cascade_set-set(resources))
-            self.object_cache.resource.add_many(new_resources)
-            resources_to_save = set(self.object_cache.resource.get_many(cascade_set))
-        else:
-            logger.warning("Still %d resources to cascade to after %d cascades",
-                           len(cascade_set), self.max_cascades)
+        # Links are saved along with the resources, so any pending from a
+        # previous attempt are forgotten.
+        self.pending_links = links.PendingLinks()
+        scheduler = scheduling.CascadeScheduler(self.pending_links, self.max_cascades)
+        self.prefetch_source_sets(resources.values())
+        scheduler.add(resources.values())
+        self.cascades_avoided = 0
+        with self.get_regenerator() as regenerator:
+            while scheduler:
+                # Sorted so that results are merged back in the same order
+                # whichever regenerator is in use.
+                resources_to_save = scheduler.next_batch()
+                i = scheduler.rounds
+                logger.debug("Cascade %d: %d resources to save (%d waiting)",
+                             i, len(resources_to_save), len(scheduler.dirty))
+                cascade_set, linked_cascade_set = set(), set()
+                hub_links = collections.defaultdict(set)
+                changed = 0
+
+                identifier_cache.prefetch(itertools.chain.from_iterable(
+                    resource.get_lookup_keys() for resource in resources_to_save))
+
+                inbound_links = self.pending_links.get_inbound_links(r.href for r in resources_to_save)
+
+                jobs, fingerprints = [], {}
+                for resource in resources_to_save:
+                    prefetched_data = {'inbound_links': inbound_links[resource.href],
+                                       'identifiers': identifier_cache}
+                    fingerprint = resource.get_input_fingerprint(prefetched_data) or ''
+                    if use_fingerprints and fingerprint and fingerprint == resource.input_fingerprint:
+                        continue
+                    fingerprints[resource.href] = fingerprint
+                    jobs.append((resource, prefetched_data))
+                logger.debug("Cascade %d: skipping %d resources with unchanged inputs",
+                             i, len(resources_to_save) - len(jobs))
+                results = regenerator.collect(jobs, self.object_cache)
+
+                for j, ((resource, _), data) in enumerate(zip(jobs, results), 1):
+                    if j % 100 == 0:
+                        logger.debug("Regenerating resource %d of %d for user %s (%d changed, %d cascades)",
+                                     j, len(jobs), self.committer.username,
+                                     changed,
+                                     len(cascade_set))
+                    if resource.input_fingerprint != fingerprints[resource.href]:
+                        resource.input_fingerprint = fingerprints[resource.href]
+                        refingerprinted_resources.add(resource)
+                    if resource.apply_data(data, cascade_set, linked_cascade_set, hub_links):
+                        identifiers_to_drop = set(identifier_cache.reverse[resource.href])
+                        changed += 1
+                        for k in identifiers_to_drop:
+                            del identifier_cache[k]
+                        for k, v in resource.identifier_data:
+                            identifier_cache[(k, v)] = resource.href
+                        self.pending_links.set_links(resource)
+                        modified_resources.add(resource)
+                self.filter_hub_links(hub_links, cascade_set, linked_cascade_set)
+                linked_cascade_set -= cascade_set
+                if not cascade_set and not linked_cascade_set:
+                    continue
+                new_resources = locking.lock_rows(models.Resource.objects.filter(href__in=(cascade_set | linked_cascade_set)-set(resources)),
+                                                  self.use_advisory_locks)
+                self.object_cache.resource.add_many(new_resources)
+                cascade_resources = list(self.object_cache.resource.get_many(cascade_set | linked_cascade_set))
+                self.prefetch_source_sets(cascade_resources)
+                for resource in cascade_resources:
+                    if resource.href in linked_cascade_set and not resource.get_plan().reads_linked_resources:
+                        self.cascades_avoided += 1
+                    else:
+                        scheduler.add([resource])
+
+        if scheduler.dropped:
+            logger.warning("Gave up on %d resources still changing after %d regenerations",
+                           len(scheduler.dropped), self.max_cascades)
+        self.cascade_stats = scheduler.stats
+        logger.debug("Cascade stats: %r", self.cascade_stats)
+
+        # Modified resources will have their fingerprints saved along with
+        # everything else.
+        bulk.bulk_update(refingerprinted_resources - modified_resources,
+                         fields=['input_fingerprint'])
         return modified_resources
 
+    def filter_hub_links(self, hub_links, cascade_set, linked_cascade_set):
+        """
+        Adds to cascade_set and linked_cascade_set those resources linked to
+        with hub-able link types that aren't currently keeping those links
+        out of their data. Hubs aren't locked or regenerated for changes to
+        the resources linking to them; they pick up crossing back under the
+        threshold next time they're regenerated for some other reason.
+        """
+        hrefs = set(hub_links) - cascade_set
+        for target in self.object_cache.resource.get_many(hrefs, ignore_missing=True):
+            if target is None:
+                continue
+            hubbed = set(target.data.get('_hubLinks', ()))
+            for link_type_name, changed in hub_links[target.href]:
+                if link_type_name in hubbed:
+                    continue
+                (cascade_set if changed else linked_cascade_set).add(target.href)
+            if target.href not in cascade_set and target.href not in linked_cascade_set:
+                self.cascades_avoided += 1
+
     def save_resources(self, resources, save_wrapper):
-        for i, resource in enumerate(resources, 1):
-            if i % 100 == 0:
-                logger.debug("Saving resource %d of %d for user %s",
-                             i, len(resources), self.committer.username)
-            with save_wrapper():
-                resource.save(regenerate=False,
-                              update_links=False,
-                              update_identifiers=False,
-                              force_update=True,
-                              object_cache=self.object_cache)
+        """
+        Writes regenerated resources in as few UPDATEs as possible, along
+        with their links and identifiers.
+        """
+        resources = sorted(resources, key=lambda r: r.href)
+        timestamp = models.now()
+        pending_signals = []
+        for resource in resources:
+            resource.bump_version(timestamp)
+            pending_signal = resource.get_future_generation_signal()
+            if pending_signal:
+                pending_signals.append(pending_signal)
+        logger.debug("Saving %d resources for user %s",
+                     len(resources), self.committer.username)
         with save_wrapper():
-            models.Identifier.objects.filter(resource_id__in=[r.href for r in resources]).delete()
-            try:
-                models.Identifier.objects.bulk_create(
-                    models.Identifier(resource=resource, scheme=scheme, value=value)
-                    for resource in resources
-                    for scheme, value in resource.identifier_data)
-            except IntegrityError as e:
-                match = re.search(r'DETAIL:  Key \(scheme, value\)=\(([^,]+), ([^)]+)\) already exists.', e.args[0])
-                if match:
-                    for resource in resources:
-                        for scheme, value in resource.identifier_data:
-                            if match.group(1) == scheme and match.group(2) == value:
-                                break
-                        else:
-                            continue
-                        break
-                    else:
-                        raise AssertionError("Couldn't find conflicting resource")
-                    raise exceptions.DuplicatedIdentifier(match.group(1), match.group(2), resource=resource) from e
-                else:
-                    raise exceptions.DuplicatedIdentifier() from e
+            bulk.bulk_update(resources)
+            deleted, created = self.pending_links.save()
+            logger.debug("Deleted %d and created %d links for user %s",
+                         deleted, created, self.committer.username)
+        for resource in resources:
+            bulk.mark_saved(resource)
+        signals.send_after_commit(pending_signals)
+
+        with save_wrapper():
+            deleted, created = models.Identifier.sync(resources)
+            logger.debug("Deleted %d and created %d identifiers for user %s",
+                         deleted, created, self.committer.username)
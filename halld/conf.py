@@ -1,4 +1,24 @@
+from django.conf import settings
 from django.db import connection
 from django.contrib.gis.db.backends.base import BaseSpatialOperations
 
 is_spatial_backend = isinstance(connection.ops, BaseSpatialOperations)
+
+# One of 'serial', 'thread' or 'process'. See halld.changeset.regeneration.
+REGENERATION_MODE = getattr(settings, 'REGENERATION_MODE', 'serial')
+# Defaults to the number of CPUs
+REGENERATION_WORKERS = getattr(settings, 'REGENERATION_WORKERS', None)
+# Lock resources for regeneration using PostgreSQL advisory locks on their
+# hrefs, instead of row locks. See halld.util.locking.
+REGENERATION_ADVISORY_LOCKS = getattr(settings, 'REGENERATION_ADVISORY_LOCKS', False)
+# Number of resources a regenerate-all job regenerates in each transaction
+REGENERATION_JOB_CHUNK_SIZE = getattr(settings, 'REGENERATION_JOB_CHUNK_SIZE', 1000)
+# Number of filtered resource documents to keep in each process, in front of
+# Django's cache. 0 to turn this off.
+FILTERED_DATA_LRU_SIZE = getattr(settings, 'FILTERED_DATA_LRU_SIZE', 1000)
+# How long to keep rendered resource responses, in seconds. They're keyed on
+# the versions of everything that went into them, so are never stale. 0 to
+# turn this off.
+RENDERED_RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RENDERED_RESPONSE_CACHE_TIMEOUT', 3600)
+# Largest page of a list that can be asked for with ?pageSize=
+MAX_PAGE_SIZE = getattr(settings, 'MAX_PAGE_SIZE', 1000)
@@ -1,6 +1,7 @@
 import collections
+import copy
 
-import jsonpointer
+from .pointer import Pointer, MISSING, _NO_DEFAULT, _step
 
 class Data(object):
     class StableIdentifierDict(dict):
@@ -15,8 +16,14 @@ class Data(object):
 
     def __init__(self, *args, **kwargs):
         self._data = dict(*args, **kwargs)
-        self['identifier'] = {}
-        self['stableIdentifier'] = Data.StableIdentifierDict(self['identifier'])
+        # Containers that are ours to modify, by id. Anything else reachable
+        # from _data may be shared (e.g. with source data), and is copied
+        # before set() writes into it. The containers themselves are kept
+        # so that their ids can't be reused.
+        self._owned = {}
+        self.own(self._data)
+        self['identifier'] = self.own({})
+        self['stableIdentifier'] = self.own(Data.StableIdentifierDict(self['identifier']))
 
     def __getitem__(self, key):
         return self._data[key]
@@ -40,22 +47,79 @@ class Data(object):
             other = other._data
         return self._data == other
 
+    def own(self, obj):
+        """
+        Marks a container as safe to modify in place, returning it.
+        """
+        self._owned[id(obj)] = obj
+        return obj
+
+    def _make_mutable(self, ptr, depth):
+        """
+        Copies any shared containers along the first depth parts of ptr,
+        stopping where the path doesn't exist. Returns the last container
+        reached.
+        """
+        container = self._data
+        for part in ptr.parts[:depth]:
+            child = _step(container, part)
+            if child is MISSING:
+                return None
+            if not isinstance(child, (dict, list)):
+                return child
+            if id(child) not in self._owned:
+                child = self.own(copy.copy(child))
+                Pointer._assign(container, part, child)
+            container = child
+        return container
+
     def set(self, ptr, value):
-        if not isinstance(ptr, jsonpointer.JsonPointer):
-            ptr = jsonpointer.JsonPointer(ptr)
-        try:
-            ptr.set(self._data, value)
-        except jsonpointer.JsonPointerException:
-            for i in range(1, len(ptr.parts)):
-                subptr = jsonpointer.JsonPointer.from_parts(ptr.parts[:i])
-                if not subptr.get(self._data, None):
-                    subptr.set(self._data, {})
-            ptr.set(self._data, value)
-
-    def resolve(self, ptr, default=jsonpointer._nothing):
-        if not isinstance(ptr, jsonpointer.JsonPointer):
-            ptr = jsonpointer.JsonPointer(ptr)
-        return ptr.get(self._data, default)
+        ptr = Pointer(ptr)
+        self._make_mutable(ptr, len(ptr.parts) - 1)
+        ptr.set(self._data, value, new_container=lambda: self.own({}))
+
+    def mutable(self, ptr):
+        """
+        Like resolve(), but the returned container can be modified in place
+        without affecting any data it was shared with.
+        """
+        ptr = Pointer(ptr)
+        self.resolve(ptr)
+        return self._make_mutable(ptr, len(ptr.parts))
+
+    def materialize(self, exclude=()):
+        """
+        Replaces any shared containers reachable from the top-level keys
+        not in exclude with copies, so that the result no longer shares
+        anything.
+        """
+        def materialize(container):
+            items = container.items() if isinstance(container, dict) else enumerate(container)
+            for key, value in list(items):
+                if not isinstance(value, (dict, list)):
+                    continue
+                if id(value) in self._owned:
+                    materialize(value)
+                else:
+                    container[key] = self.own(copy.deepcopy(value))
+        for key in list(self._data):
+            if key in exclude:
+                continue
+            value = self._data[key]
+            if not isinstance(value, (dict, list)):
+                continue
+            if id(value) in self._owned:
+                materialize(value)
+            else:
+                self._data[key] = self.own(copy.deepcopy(value))
+
+    def resolve(self, ptr, default=_NO_DEFAULT):
+        """
+        Returns the value at ptr. If there isn't one, returns default, or
+        raises JsonPointerException if no default was given. Pass
+        pointer.MISSING as the default to test for absence without raising.
+        """
+        return Pointer(ptr).get(self._data, default)
 
     def copypointer(self, src, dst):
         self.set(dst, self.resolve(src))
@@ -24,6 +24,16 @@ class LinkTypeDefinition(object, metaclass=abc.ABCMeta):
     inverted = False
     strict = True
     timeless = False
+    # Once a resource has more than this many inbound links of this type,
+    # they're left out of its data and served as a paged collection at
+    # <resource href>/link/<name> instead. Changes to the resources linking
+    # to it then no longer cause it to be regenerated.
+    hub_threshold = None
+    inverse_hub_threshold = None
+    # At most this many links of this type are included in a response for a
+    # resource, with the rest left to the paged collection.
+    inline_limit = None
+    inverse_inline_limit = None
 
     @staticmethod
     def new(name, inverse_name,
@@ -31,7 +41,9 @@ class LinkTypeDefinition(object, metaclass=abc.ABCMeta):
             include=True, inverse_include=True,
             embed=False, inverse_embed=False,
             subresource=False, inverse_subresource=False,
-            inverted=False, strict=True, timeless=False):
+            inverted=False, strict=True, timeless=False,
+            hub_threshold=None, inverse_hub_threshold=None,
+            inline_limit=None, inverse_inline_limit=None):
         link = type(name.title() + 'LinkTypeDefinition', (LinkTypeDefinition,),
                     {'name': name,
                      'inverse_name': inverse_name,
@@ -45,7 +57,11 @@ class LinkTypeDefinition(object, metaclass=abc.ABCMeta):
                      'inverse_subresource': inverse_subresource,
                      'inverted': inverted,
                      'strict': strict,
-                     'timeless': timeless})
+                     'timeless': timeless,
+                     'hub_threshold': hub_threshold,
+                     'inverse_hub_threshold': inverse_hub_threshold,
+                     'inline_limit': inline_limit,
+                     'inverse_inline_limit': inverse_inline_limit})
         return link
 
     def inverse(self):
@@ -54,5 +70,7 @@ class LinkTypeDefinition(object, metaclass=abc.ABCMeta):
                                       self.inverse_include, self.include,
                                       self.inverse_embed, self.embed,
                                       self.inverse_subresource, self.subresource,
-                                      not self.inverted, self.strict, self.timeless)()
+                                      not self.inverted, self.strict, self.timeless,
+                                      self.inverse_hub_threshold, self.hub_threshold,
+                                      self.inverse_inline_limit, self.inline_limit)()
 
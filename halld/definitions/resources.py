@@ -1,4 +1,5 @@
 import abc
+import collections
 import copy
 import re
 import threading
@@ -11,10 +12,26 @@ from django.core.exceptions import PermissionDenied
 
 from .. import get_halld_config
 from .. import exceptions
+from ..util.dependencies import dependencies, reads_linked_resources
 from django.utils.functional import cached_property
 
 uuid_re = re.compile('^[0-9a-f]{32}$')
 
+def qualified_name(func):
+    # Bound methods report the class they were defined on
+    func = getattr(func, '__func__', func)
+    if not hasattr(func, '__qualname__'):
+        func = type(func)
+    return '{}.{}'.format(func.__module__, func.__qualname__)
+
+# What regenerating a resource of a given type with a given set of source
+# types involves. See ResourceTypeDefinition.get_plan().
+InferencePlan = collections.namedtuple('InferencePlan', ['inferences', 'normalizations',
+                                                         'lookups', 'fingerprintable',
+                                                         'reads_linked_resources',
+                                                         'reads_linked_data',
+                                                         'normalization_names'])
+
 class ResourceTypeDefinition(object, metaclass=abc.ABCMeta):
     @abc.abstractproperty
     def name(self):
@@ -50,6 +67,49 @@ class ResourceTypeDefinition(object, metaclass=abc.ABCMeta):
     def inferences(self):
         return self.get_inferences()
 
+    @cached_property
+    def source_type_order(self):
+        return {name: i for i, name in enumerate(self.source_types)}
+
+    @cached_property
+    def _plans(self):
+        return {}
+
+    def get_plan(self, source_type_names):
+        """
+        Returns an InferencePlan for resources of this type with sources of
+        the given types, in source_types order. Plans are built once per
+        combination of source types.
+        """
+        source_type_names = tuple(source_type_names)
+        try:
+            return self._plans[source_type_names]
+        except KeyError:
+            pass
+        source_types = get_halld_config().source_types
+        inferences = tuple(self.inferences) + tuple(inference
+                                                   for name in source_type_names
+                                                   for inference in source_types[name].inferences)
+        normalizations = tuple(self.get_normalizations())
+        plan = InferencePlan(
+            inferences=inferences,
+            normalizations=normalizations,
+            lookups=tuple(inference for inference in inferences
+                                    if hasattr(inference, 'get_lookup_keys')),
+            fingerprintable=all(getattr(inference, 'fingerprintable', False)
+                                for inference in inferences + normalizations),
+            reads_linked_resources=any(map(reads_linked_resources, inferences + normalizations)),
+            # Whether anything reads linked resources other than by looking
+            # up their identifiers, which can be prefetched
+            reads_linked_data=any(reads_linked_resources(inference) and not hasattr(inference, 'get_lookup_keys')
+                                  for inference in inferences + normalizations),
+            # Included in input fingerprints, so that changing normalizations
+            # means regenerating
+            normalization_names=tuple(map(qualified_name, normalizations)),
+        )
+        self._plans[source_type_names] = plan
+        return plan
+
     def get_inferences(self):
         return []
 
@@ -81,6 +141,12 @@ class ResourceTypeDefinition(object, metaclass=abc.ABCMeta):
 
     allow_uri_override = False
 
+    # Whether inferences see source data without it being copied first,
+    # which saves a deep copy of each source on every regeneration. Only set
+    # this to True if all of your inferences change data by calling
+    # data.set(), rather than by modifying what they've read in place.
+    copy_on_write_sources = False
+
     def is_valid_identifier(self, identifier):
         return uuid_re.match(identifier) is not None
 
@@ -95,6 +161,19 @@ class ResourceTypeDefinition(object, metaclass=abc.ABCMeta):
     def get_filtered_data(self, resource, user, data):
         return copy.deepcopy(data)
 
+    def get_filter_class(self, user):
+        """
+        Returns a string naming the users that get_filtered_data() treats
+        the same as user, e.g. 'anonymous', 'staff' or a role. Filtered data
+        is cached per filter class, so override this along with
+        get_filtered_data(). If that's overridden and this isn't, each user
+        is their own class.
+        """
+        if type(self).get_filtered_data is ResourceTypeDefinition.get_filtered_data:
+            return 'everyone'
+        return 'user:' + user.username
+
+    @dependencies(reads_linked_resources=False, fingerprintable=True)
     def normalize_links(self, resource, data, **kwargs):
         """
         Makes sure that each link is a list of dicts, each with a href.
@@ -116,21 +195,33 @@ class ResourceTypeDefinition(object, metaclass=abc.ABCMeta):
             if links:
                 data[link_type.name] = links
 
+    @dependencies(reads_linked_resources=False, fingerprintable=True)
     def normalize_dates(self, resource, data, **kwargs):
         pass # TODO
 
+    @dependencies(reads_linked_resources=False, fingerprintable=True)
     def add_inbound_links(self, resource, data, prefetched_data, **kwargs):
         from ..models import Link
         inbound_links = prefetched_data.get('inbound_links', Link.objects.filter(target_href=resource.href))
+        link_types = get_halld_config().link_types
+        links_by_type = collections.defaultdict(list)
         for link in inbound_links:
-            link_type = get_halld_config().link_types[link.type_id].inverse()
-            link_dict = {'href': link.source_id,
-                         'inbound': True}
-            if link_type.name in data:
-                data[link_type.name].append(link_dict)
+            link_type_name = link_types[link.type_id].inverse_name
+            links_by_type[link_type_name].append({'href': link.source_id,
+                                                  'inbound': True})
+        hub_links = []
+        for link_type_name, link_dicts in links_by_type.items():
+            hub_threshold = link_types[link_type_name].hub_threshold
+            if hub_threshold is not None and len(link_dicts) > hub_threshold:
+                hub_links.append(link_type_name)
+            elif link_type_name in data:
+                data[link_type_name].extend(link_dicts)
             else:
-                data[link_type.name] = [link_dict]
+                data[link_type_name] = link_dicts
+        if hub_links:
+            data['_hubLinks'] = sorted(hub_links)
 
+    @dependencies(reads_linked_resources=False, fingerprintable=True)
     def sort_links(self, resource, data, **kwargs):
         for link_type in get_halld_config().link_types.values():
             try:
@@ -140,11 +231,50 @@ class ResourceTypeDefinition(object, metaclass=abc.ABCMeta):
             else:
                 links.sort(key=lambda link: link['href'])
 
+    # Whether what's shown of a resource where it's linked to (its title and
+    # any describes link), and that it exists at all, is the same for
+    # everyone. If None, it is unless get_filtered_data() or
+    # add_derived_data() is overridden, as they may hide or change either.
+    public_link_summary = None
+
+    def has_public_link_summary(self):
+        if self.public_link_summary is not None:
+            return self.public_link_summary
+        return type(self).get_filtered_data is ResourceTypeDefinition.get_filtered_data \
+           and type(self).add_derived_data is ResourceTypeDefinition.add_derived_data
+
+    def get_link_summary(self, resource, data):
+        """
+        Returns the parts of data shown where resource is linked to, for
+        storing alongside it, or None if they depend on who's looking.
+        """
+        if not self.has_public_link_summary():
+            return None
+        summary = {}
+        if 'title' in data:
+            summary['title'] = data['title']
+        if 'describes' in data:
+            summary['describes'] = data['describes']
+        return summary
+
+    def cache_rendered_responses(self):
+        """
+        Whether responses for resources of this type can be cached until
+        they or the resources they link to change. Not by default if
+        add_derived_data() is overridden, as it may add real-time data.
+        """
+        return type(self).add_derived_data is ResourceTypeDefinition.add_derived_data
+
     def add_derived_data(self, resource, data, object_cache, **kwargs):
         """
         Provides an opportunity to modify the data just before it's sent to
         the user. Can be used to include real-time information, or include
         data from related resources once they've been filtered.
+
+        If the user asked for only some fields, the fields keyword argument
+        is a halld.projection.Projection, and data has already been pruned
+        to them; use fields.includes(name) to skip anything that won't be
+        shown. Otherwise it's None.
         """
         pass
 
@@ -152,6 +282,8 @@ class DefaultFilteredResourceTypeDefinition(ResourceTypeDefinition):
     """
     Subclass this to not expose any data by default.
     """
+    public_link_summary = False
+
     def filter_data(self, user, source, data):
         return {}
 
@@ -11,15 +11,25 @@ class HALLDException(APIException, metaclass=abc.ABCMeta):
     def name(self):
         pass
 
+    # The id of the changeset update that caused this error, if any
+    update_id = None
+    # The line of a streamed request body that caused this error, if any
+    line = None
+
     def __init__(self):
         pass
 
     @property
     def detail(self):
-        return response_data.Error({
+        data = response_data.Error({
             'error': self.name,
             'detail': self.description,
         })
+        if self.update_id is not None:
+            data['updateId'] = self.update_id
+        if self.line is not None:
+            data['line'] = self.line
+        return data
 
 class SourceDeleted(APIException):
     name = 'source-deleted'
@@ -165,6 +175,26 @@ class SourceDataWithoutResource(HALLDException):
         }
         return data
 
+class BadHrefs(HALLDException):
+    name = 'bad-hrefs'
+    description = "Some of the source hrefs you supplied aren't of the form <resource-href>/source/<source-type>."
+    status_code = http.client.BAD_REQUEST
+
+    def __init__(self, hrefs):
+        if isinstance(hrefs, str):
+            hrefs = [hrefs]
+        self.hrefs = hrefs
+
+    @property
+    def detail(self):
+        data = super().detail
+        data['_links'] = {
+            'badHrefs': [{
+                'href': href,
+            } for href in sorted(self.hrefs)],
+        }
+        return data
+
 class SourceValidationFailed(HALLDException):
     name = 'source-validation-failed'
     description = 'The source data you uploaded is invalid'
@@ -307,6 +337,18 @@ class InvalidParameter(HALLDException):
     description = "You supplied an invalid value for a query parameter."
     status_code = http.client.BAD_REQUEST
 
+    def __init__(self, parameter_name=None, parameter_detail=None):
+        self.parameter_name, self.parameter_detail = parameter_name, parameter_detail
+
+    @property
+    def detail(self):
+        data = super().detail
+        if self.parameter_name:
+            data['parameterName'] = self.parameter_name
+        if self.parameter_detail:
+            data['parameterDetail'] = self.parameter_detail
+        return data
+
 class MissingParameter(HALLDException):
     name = 'missing-parameter'
     description = "A required query parameter was missing."
@@ -8,6 +8,12 @@ class FileResourceTypeDefinition(ResourceTypeDefinition):
 
     allowable_media_types = None
     maximum_file_size = 10 * 1024 * 1024 # 10MiB
+    # describes comes from the uploaded file, which can change without the
+    # resource being regenerated.
+    public_link_summary = False
+
+    def cache_rendered_responses(self):
+        return False
 
     @abc.abstractmethod
     def parse_file(self, f, content_type):
@@ -4,20 +4,33 @@ import itertools
 import json
 import logging
 
-import jsonpointer
-
 from . import models
+from .pointer import Pointer, MISSING
 
 logger = logging.getLogger(__name__)
 
 class Inference(metaclass=abc.ABCMeta):
     inferred_keys = ()
+    # Whether the result depends only on source data, inbound links and
+    # looked-up identifiers, and so will be the same given the same input
+    # fingerprint. See Resource.get_input_fingerprint(). Off unless declared,
+    # as resources are otherwise skipped when their fingerprint is unchanged.
+    fingerprintable = False
+
+    # Whether this inference looks at anything belonging to another resource,
+    # such as its data or identifiers. If no inference for a resource does,
+    # it needn't be regenerated when a resource it's linked to changes,
+    # unless the links themselves change.
+    reads_linked_resources = True
 
     @abc.abstractmethod
     def __call__(self, resource, hal):
         pass
 
 class Tags(Inference):
+    fingerprintable = True
+    reads_linked_resources = False
+
     def __call__(self, resource, data, **kwargs):
         tags = resource.get_type().get_contributed_tags(resource, data)
         for source in resource.cached_source_set:
@@ -27,33 +40,36 @@ class Tags(Inference):
         return data
 
 class FromPointers(Inference):
+    reads_linked_resources = False
+
     def __init__(self, target, *pointers):
-        self.target = jsonpointer.JsonPointer(target)
+        self.target = Pointer(target)
         self.inferred_keys = {target}
-        self.pointers = list(map(jsonpointer.JsonPointer, pointers))
+        self.pointers = list(map(Pointer, pointers))
 
 class FirstOf(FromPointers):
+    fingerprintable = True
+
     def __init__(self, target, *pointers, update=False):
         self.update = update
         super(FirstOf, self).__init__(target, *pointers)
 
     def __call__(self, resource, data, **kwargs):
         for pointer in self.pointers:
-            try:
-                result = data.resolve(pointer)
-            except jsonpointer.JsonPointerException:
+            result = data.resolve(pointer, MISSING)
+            if result is MISSING:
                 continue
             if self.update:
                 if not isinstance(result, dict):
                     continue
-                try:
-                    target = data.resolve(self.target)
+                if data.resolve(self.target, MISSING) is MISSING:
+                    data.set(self.target, result)
+                else:
+                    target = data.mutable(self.target)
                     if not isinstance(target, dict):
                         logger.warning("FirstOf target %s is not a dict", self.target)
                         return
                     target.update(result)
-                except jsonpointer.JsonPointerException:
-                    data.set(self.target, result)
             else:
                 data.set(self.target, result)
             return
@@ -64,19 +80,36 @@ class FirstOf(FromPointers):
                                             ', update=True' if self.update else '')
 
 class Lookup(FromPointers):
+    # The identifiers of other resources, though only those prefetched by
+    # the updater (see InferencePlan.lookups)
+    reads_linked_resources = True
+
     def __init__(self, target, scheme, *pointers):
-        self.target = jsonpointer.JsonPointer(target)
+        self.target = Pointer(target)
         self.scheme = scheme
-        self.pointers = list(map(jsonpointer.JsonPointer, pointers))
+        self.pointers = list(map(Pointer, pointers))
 
-    def __call__(self, resource, data, prefetched_data, **kwargs):
+    @property
+    def fingerprintable(self):
+        # We can only tell which identifiers we'll look up before the other
+        # inferences have run if we're looking at source data.
+        return all(pointer.path.startswith('/@source/') for pointer in self.pointers)
+
+    def resolve_value(self, data):
         for pointer in self.pointers:
-            try:
-                value = data.resolve(pointer)
-                break
-            except jsonpointer.JsonPointerException:
-                continue
-        else:
+            value = data.resolve(pointer, MISSING)
+            if value is not MISSING:
+                return pointer, value
+        return None, None
+
+    def get_lookup_keys(self, data):
+        pointer, value = self.resolve_value(data)
+        if pointer is not None:
+            yield (self.scheme, value)
+
+    def __call__(self, resource, data, prefetched_data, **kwargs):
+        pointer, value = self.resolve_value(data)
+        if pointer is None:
             return
 
         try:
@@ -101,6 +134,8 @@ class Set(FromPointers):
     constructor, which includes the pre-existing values at the target in the
     result.
     """
+    fingerprintable = True
+
     def __init__(self, target, *pointers, append=False):
         if append:
             pointers += (target,)
@@ -127,6 +162,8 @@ class Set(FromPointers):
 
 class ResourceMeta(Inference):
     inferred_keys = ('catalogRecord','inCatalog')
+    fingerprintable = False
+    reads_linked_resources = False
 
     def __init__(self, catalog_uri):
         self.catalog_uri = catalog_uri
@@ -0,0 +1,50 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from halld.changeset.jobs import RegenerationJobRunner
+from halld.models import RegenerationJob
+
+class Command(BaseCommand):
+    help = "Runs pending regenerate-all jobs, and resumes interrupted ones"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--job', type='int', dest='job',
+                    help="Only run the job with this id"),
+        make_option('--watch', action='store_true', dest='watch', default=False,
+                    help="Keep polling for new jobs"),
+        make_option('--poll-interval', type='float', dest='poll_interval', default=10,
+                    help="Seconds between polls when watching"),
+        make_option('--regeneration-mode', dest='regeneration_mode',
+                    help="One of 'serial', 'thread' or 'process'"),
+        make_option('--workers', type='int', dest='regeneration_workers'),
+    )
+
+    def handle(self, *args, **options):
+        failed = 0
+        while True:
+            jobs = RegenerationJob.objects.filter(state__in=('pending', 'running')).order_by('created')
+            if options['job']:
+                jobs = jobs.filter(pk=options['job'])
+            for job in jobs:
+                runner = RegenerationJobRunner(job,
+                                               regeneration_mode=options['regeneration_mode'],
+                                               regeneration_workers=options['regeneration_workers'])
+                try:
+                    job = runner.run()
+                except Exception:
+                    # The runner has logged the traceback and marked the job
+                    # as failed; carry on with the others.
+                    failed += 1
+                    job = RegenerationJob.objects.get(pk=job.pk)
+                    self.stderr.write("Job {}: {} ({} of {} resources processed, {} modified): {}".format(
+                        job.pk, job.state, job.processed, job.total, job.modified, job.error))
+                    continue
+                self.stdout.write("Job {}: {} ({} of {} resources processed, {} modified)".format(
+                    job.pk, job.state, job.processed, job.total, job.modified))
+            if not options['watch']:
+                break
+            time.sleep(options['poll_interval'])
+        if failed:
+            raise CommandError("{} regeneration job(s) failed".format(failed))
@@ -1,15 +1,15 @@
-import jsonpointer
 import markdown
 
 from .conf import MARKDOWN_PARAMS
 from ..inference import FromPointers
+from ..pointer import MISSING
 
 class Markdown(FromPointers):
+    fingerprintable = True
+
     def __call__(self, resource, data, **kwargs):
         for pointer in self.pointers:
-            try:
-                result = data.resolve(pointer)
+            result = data.resolve(pointer, MISSING)
+            if result is not MISSING:
                 data.set(self.target, markdown.markdown(result, **MARKDOWN_PARAMS))
                 return
-            except jsonpointer.JsonPointerException:
-                pass
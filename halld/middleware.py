@@ -1,12 +1,11 @@
-import json
-
 from django.http import HttpResponse
 
 from . import exceptions
+from .util import serializers
 
 class ExceptionMiddleware(object):
     def process_exception(self, request, exception):
         if isinstance(exception, exceptions.HALLDException):
-            return HttpResponse(json.dumps(exception.as_hal(), indent=2),
+            return HttpResponse(serializers.dumps(exception.as_hal(), request),
                                 content_type='application/hal+json',
                                 status=exception.status_code)
@@ -1,3 +1,4 @@
+import collections
 import copy
 import datetime
 import hashlib
@@ -20,9 +21,9 @@ from stalefields.stalefields import StaleFieldsMixin
 from . import get_halld_config
 from .definitions import ResourceTypeDefinition
 from . import signals, exceptions
-from .conf import is_spatial_backend
+from .conf import is_spatial_backend, FILTERED_DATA_LRU_SIZE, REGENERATION_JOB_CHUNK_SIZE
 from .data import Data
-import itertools
+from .util.lru import LRUCache
 
 if is_spatial_backend:
     from django.contrib.gis.db import models
@@ -34,6 +35,12 @@ logger = logging.getLogger(__name__)
 
 MAX_HREF_LENGTH = 2048
 
+# In-process tier in front of the cache for Resource.get_filtered_data_many(),
+# keyed by (href, version, filter class), holding serialized data.
+filtered_data_lru = LRUCache(FILTERED_DATA_LRU_SIZE)
+# Hits and misses for the tier behind it
+filtered_data_stats = collections.Counter()
+
 def now():
     return pytz.utc.localize(datetime.datetime.utcnow())
 
@@ -64,6 +71,12 @@ class Resource(models.Model, StaleFieldsMixin):
     data = JSONField(default={}, blank=True)
 
     version = models.PositiveIntegerField(default=0)
+    # A hash of everything that went into data the last time it was
+    # regenerated by a SourceUpdater. See get_input_fingerprint().
+    input_fingerprint = models.CharField(max_length=40, blank=True)
+    # What's shown of this resource where it's linked to, or None if that
+    # depends on who's looking. See ResourceTypeDefinition.get_link_summary().
+    link_summary = JSONField(default=None, null=True, blank=True)
 
     deleted = models.BooleanField(default=False)
 
@@ -90,24 +103,36 @@ class Resource(models.Model, StaleFieldsMixin):
     @cached_source_set.setter
     def cached_source_set(self, value):
         self._cached_source_set = list(value)
-        self._cached_source_set.sort(key=lambda s: self.get_type().source_types.index(s.get_type().name))
+        source_type_order = self.get_type().source_type_order
+        self._cached_source_set.sort(key=lambda s: source_type_order[s.type_id])
     @cached_source_set.deleter
     def cached_source_set(self):
         self._cached_source_set = None
 
     def collect_data(self, object_cache, prefetched_data):
+        copy_on_write = self.get_type().copy_on_write_sources
         data = Data()
         data['href'] = self.get_absolute_url()
-        data['@source'], data['identifier'], data['stableIdentifier'] = {}, {}, {}
+        data['@source'], data['identifier'], data['stableIdentifier'] = data.own({}), data.own({}), data.own({})
         for source in self.cached_source_set:
-            data['@source'][source.type_id] = copy.deepcopy(source.data)
+            # Source data is shared with the Source objects, and only copied
+            # where it's written to or ends up in our data.
+            if copy_on_write:
+                data['@source'][source.type_id] = source.data
+            else:
+                data['@source'][source.type_id] = copy.deepcopy(source.data)
         self.collect_identifiers(data)
-        for inference in self.get_inferences():
+        plan = self.get_plan()
+        for inference in plan.inferences:
             inference(resource=self,
                       data=data,
                       object_cache=object_cache,
                       prefetched_data=prefetched_data)
-        for normalization in self.get_normalizations():
+        if copy_on_write:
+            # Normalizations may modify what inferences have copied from
+            # source data in place.
+            data.materialize(exclude=('@source',))
+        for normalization in plan.normalizations:
             normalization(resource=self,
                           data=data,
                           object_cache=object_cache,
@@ -121,15 +146,101 @@ class Resource(models.Model, StaleFieldsMixin):
         del data['@source']
         return data._data
 
+    def get_input_fingerprint(self, prefetched_data):
+        """
+        Returns a hash of the inputs to collect_data(), being the versions of
+        our sources, our inbound links, the targets of any identifier lookups,
+        the definitions version and which normalizations are applied. Returns None if any of our inferences
+        depend on something else, in which case we can't tell whether
+        regenerating would be a no-op.
+        """
+        if not self.get_plan().fingerprintable:
+            return None
+
+        identifiers = prefetched_data.get('identifiers', {})
+        lookups = set()
+        for scheme, value in self.get_lookup_keys():
+            try:
+                target = identifiers[(scheme, value)]
+            except (KeyError, Identifier.DoesNotExist):
+                target = None
+            lookups.add((scheme, str(value), target))
+
+        inbound_links = prefetched_data.get('inbound_links')
+        if inbound_links is None:
+            inbound_links = Link.objects.filter(target_href=self.href)
+
+        fingerprint = (
+            get_halld_config().definitions_version,
+            self.href,
+            tuple(sorted((source.type_id, source.version) for source in self.cached_source_set)),
+            tuple(sorted((link.source_id, link.type_id) for link in inbound_links)),
+            tuple(sorted(lookups, key=repr)),
+            self.get_plan().normalization_names,
+        )
+        return hashlib.sha1(repr(fingerprint).encode()).hexdigest()
+
+    def get_lookup_keys(self):
+        """
+        Returns the (scheme, value) pairs our inferences will look up that
+        can be determined from our source data alone.
+        """
+        lookups = self.get_plan().lookups
+        if not lookups:
+            return set()
+        data = Data()
+        data['@source'] = {source.type_id: source.data for source in self.cached_source_set}
+        keys = set()
+        for inference in lookups:
+            keys.update(inference.get_lookup_keys(data))
+        return keys
+
     def regenerate(self, cascade_set, object_cache, prefetched_data):
         data = self.collect_data(object_cache, prefetched_data)
+        # We've not worked out what went into data, so the fingerprint from
+        # the last SourceUpdater regeneration no longer describes it.
+        self.input_fingerprint = ''
+        return self.apply_data(data, cascade_set)
+
+    def apply_data(self, data, cascade_set, linked_cascade_set=None, hub_links=None):
+        """
+        Merges the output of collect_data() into this resource. Returns
+        whether anything changed.
+
+        The hrefs of resources we've added or removed links to, and so whose
+        inbound links have changed, are added to cascade_set. Those of any
+        other resources we're linked to are added to linked_cascade_set if
+        given, or cascade_set otherwise. They only need regenerating if they
+        look at linked resources.
+
+        If hub_links (a defaultdict(set)) is given, resources we link to
+        with a type whose inverse has a hub_threshold are left to the caller,
+        as they may not need regenerating at all. hub_links[href] gets
+        (inverse link type name, changed) pairs for them.
+        """
         if data == self.data:
             return False
         old_data, self.data = self.data, data
         self.update_denormalized_fields()
-        previous_linked_hrefs = self.get_link_hrefs(old_data)
-        new_linked_hrefs = self.get_link_hrefs(data)
-        cascade_set |= (previous_linked_hrefs | new_linked_hrefs)
+        previous_links = self.get_links(old_data)
+        new_links = self.get_links(data)
+        changed_links = previous_links ^ new_links
+        if hub_links is not None:
+            link_types = get_halld_config().link_types
+            for link in previous_links | new_links:
+                href, link_type_name, inbound = link
+                link_type = link_types[link_type_name]
+                if not inbound and link_type.inverse_hub_threshold is not None:
+                    hub_links[href].add((link_type.inverse_name, link in changed_links))
+                    previous_links.discard(link)
+                    new_links.discard(link)
+                    changed_links.discard(link)
+        changed_hrefs = {href for href, link_type_name, inbound in changed_links
+                              if not inbound}
+        cascade_set |= changed_hrefs
+        if linked_cascade_set is None:
+            linked_cascade_set = cascade_set
+        linked_cascade_set |= {href for href, link_type_name, inbound in previous_links | new_links} - changed_hrefs
         return True
 
     def save(self, *args, **kwargs):
@@ -161,9 +272,8 @@ class Resource(models.Model, StaleFieldsMixin):
         update_identifiers = kwargs.pop('update_identifiers', True)
 
         if 'data' in self.stale_fields:
-            self.created = self.created or now()
-            self.modified = now()
-            self.version += 1
+            self.bump_version()
+            self.update_link_summary()
 
             super(Resource, self).save(*args, **kwargs)
             if update_links:
@@ -181,14 +291,57 @@ class Resource(models.Model, StaleFieldsMixin):
                     resource.save(regeneration_path=regeneration_path,
                                   object_cache=object_cache)
 
-            for date in [self.start_date, self.end_date]:
-                if date and date > now():
-                    signals.request_future_resource_generation.send(self, when=date)
-                    break
+            pending_signal = self.get_future_generation_signal()
+            if pending_signal:
+                signal, sender, signal_kwargs = pending_signal
+                signal.send(sender, **signal_kwargs)
 
         elif self.is_stale:
             super(Resource, self).save(*args, **kwargs)
 
+    def bump_version(self, timestamp=None):
+        """
+        Updates version and timestamps to reflect a change to data.
+        """
+        timestamp = timestamp or now()
+        self.created = self.created or timestamp
+        self.modified = timestamp
+        self.version += 1
+
+    def get_future_generation_signal(self):
+        """
+        Returns a (signal, sender, kwargs) triple requesting that we be
+        regenerated when we next come into or go out of existence, or None if
+        neither is in the future.
+        """
+        for date in [self.start_date, self.end_date]:
+            if date and date > now():
+                return (signals.request_future_resource_generation, self, {'when': date})
+
+
+    def update_link_summary(self):
+        self.link_summary = self.get_type().get_link_summary(self, self.data)
+
+    @classmethod
+    def get_link_summaries(cls, hrefs):
+        """
+        Returns a dict from hrefs to link summaries (with href, extant and
+        version added) for those of the resources that have one, without
+        fetching their data. Summaries stored before their type stopped
+        having public link summaries are ignored.
+        """
+        summaries = {}
+        resource_types = get_halld_config().resource_types
+        resources = cls.objects.filter(href__in=set(hrefs), deleted=False) \
+                               .exclude(link_summary=None) \
+                               .values_list('href', 'type_id', 'extant', 'version', 'link_summary')
+        for href, type_id, extant, version, link_summary in resources:
+            if isinstance(link_summary, str):
+                link_summary = json.loads(link_summary)
+            if link_summary is None or not resource_types[type_id].has_public_link_summary():
+                continue
+            summaries[href] = dict(link_summary, href=href, extant=extant, version=version)
+        return summaries
 
     def update_denormalized_fields(self):
         self.uri = self.data['@id']
@@ -228,32 +381,35 @@ class Resource(models.Model, StaleFieldsMixin):
             else:
                 self.point = None
 
+        self.update_link_summary()
+
+    def get_plan(self):
+        return self.get_type().get_plan(s.type_id for s in self.cached_source_set)
+
     def get_inferences(self):
-        return itertools.chain(
-            self.get_type().inferences,
-            *(s.get_type().inferences for s in self.cached_source_set)
-        )
+        return self.get_plan().inferences
 
     def get_normalizations(self):
-        return self.get_type().get_normalizations()
+        return self.get_plan().normalizations
 
     def get_type(self):
         return get_halld_config().resource_types[self.type_id]
 
-    def get_link_hrefs(self, data):
-        link_hrefs = set()
+    def get_links(self, data):
+        """
+        Returns (href, link_type_name, inbound) triples for the links in data.
+        """
+        links = set()
         for link_type in get_halld_config().link_types.values():
             for link in data.get(link_type.name, ()):
-                link_hrefs.add(link['href'])
-        return link_hrefs
+                links.add((link['href'], link_type.name, bool(link.get('inbound'))))
+        return links
 
-    def update_links(self):
+    def get_outbound_links(self):
         """
-        Maintains Link objects based on self.data.
+        Returns the (target_href, link_type_name) pairs that should be stored
+        as Link objects for self.data.
         """
-        if not self.pk:
-            super(Resource, self).save()
-
         link_data = set()
         for link_type in get_halld_config().link_types.values():
             links = self.data.get(link_type.name, ())
@@ -261,12 +417,15 @@ class Resource(models.Model, StaleFieldsMixin):
                 if link.get('inbound'):
                     continue
                 link_data.add((link['href'], link_type.name))
+        return link_data
 
-        self.link_set.all().delete()
-        Link.objects.bulk_create([
-            Link(source=self, target_href=href, type_id=link_name)
-            for href, link_name in link_data
-        ])
+    def update_links(self):
+        """
+        Maintains Link objects based on self.data.
+        """
+        if not self.pk:
+            super(Resource, self).save()
+        Link.sync({self.href: self.get_outbound_links()})
 
     def collect_identifiers(self, data):
         data['stableIdentifier'].update(self.get_type().get_identifiers(self, data))
@@ -290,22 +449,7 @@ class Resource(models.Model, StaleFieldsMixin):
             return self.data.get('stableIdentifier', {}).items()
 
     def update_identifiers(self):
-        Identifier.objects.filter(resource=self).delete()
-        try:
-            with transaction.atomic():
-                Identifier.objects.bulk_create([
-                    Identifier(resource=self, scheme=scheme, value=value)
-                    for scheme, value in self.identifier_data
-                ])
-        except IntegrityError:
-            # One of them was duplicated, so find out which one
-            for scheme, value in self.identifier_data:
-                try:
-                    Identifier.objects.create(resource=self,
-                                              scheme=scheme,
-                                              value=value)
-                except IntegrityError as e:
-                    raise exceptions.DuplicatedIdentifier(scheme, value, self) from e
+        Identifier.sync([self])
 
     def get_absolute_uri(self, data=None):
         data = data or self.data
@@ -324,18 +468,54 @@ class Resource(models.Model, StaleFieldsMixin):
     def get_absolute_url(self):
         return self.get_type().base_url + self.identifier
 
+    def get_filtered_data_cache_key(self, filter_class):
+        key = '{}\n{}'.format(filter_class, self.href)
+        return 'filtered:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
     def get_filtered_data(self, user):
-        key = 'filtered:{}:{}'.format(user.username,
-                                      hashlib.sha256(self.href.encode('utf-8')).hexdigest())
-        data = cache.get(key)
-        if data:
-            version, data = json.loads(data)
-            if version != self.version:
-                data = None
-        if not data:
-            data = self.get_type().get_filtered_data(self, user, self.data)
-            cache.set(key, json.dumps((self.version, data)), None)
-        return data
+        return self.get_filtered_data_many([self], user)[self.href]
+
+    @classmethod
+    def get_filtered_data_many(cls, resources, user):
+        """
+        Returns a dict from hrefs to what user can see of each of resources.
+        Filtered data is shared between users in the same filter class (see
+        ResourceTypeDefinition.get_filter_class()), and looked up first in
+        filtered_data_lru, then with one round-trip to the cache. Those in
+        neither are stored with at most one more. Raises PermissionDenied if
+        user can't see any one of them.
+        """
+        filtered_data, lru_keys, keys = {}, {}, {}
+        for resource in resources:
+            filter_class = resource.get_type().get_filter_class(user)
+            lru_key = (resource.href, resource.version, filter_class)
+            data = filtered_data_lru.get(lru_key)
+            if data is not None:
+                filtered_data[resource.href] = json.loads(data)
+            else:
+                lru_keys[resource.href] = lru_key
+                keys[resource.get_filtered_data_cache_key(filter_class)] = resource
+        if not keys:
+            return filtered_data
+        cached = cache.get_many(list(keys))
+        misses = {}
+        for key, resource in keys.items():
+            data = cached.get(key)
+            if data:
+                version, data = json.loads(data)
+                if version != resource.version:
+                    data = None
+            if data:
+                filtered_data_stats['cache_hits'] += 1
+            else:
+                filtered_data_stats['misses'] += 1
+                data = resource.get_type().get_filtered_data(resource, user, resource.data)
+                misses[key] = json.dumps((resource.version, data))
+            filtered_data_lru.set(lru_keys[resource.href], json.dumps(data))
+            filtered_data[resource.href] = data
+        if misses:
+            cache.set_many(misses, None)
+        return filtered_data
 
     @classmethod
     def create(cls, creator, resource_type, identifier=None):
@@ -401,26 +581,41 @@ class Source(models.Model, StaleFieldsMixin):
     def get_type(self):
         return get_halld_config().source_types[self.type_id]
 
-    def save(self, *args, **kwargs):
+    def prepare_save(self, timestamp=None):
+        """
+        Sets our href, version and timestamps ready to be written. Returns
+        whether we've not been saved before, and a (signal, sender, kwargs)
+        triple to send once we have, or None if our data hasn't changed.
+        """
         original_values = {name: self._original_state[name] for name in self.stale_fields}
-        cascade_to_resource = kwargs.pop('cascade_to_resource', True)
         created = not self.href
         if created:
             self.href = self.resource_id + '/source/' + self.type_id
 
         self.deleted = self.data is None
 
-        if created or 'data' in original_values:
-            self.version += 1
-            self.created = self.created or now()
-            self.modified = now()
+        if not (created or 'data' in original_values):
+            return created, None
+
+        timestamp = timestamp or now()
+        self.version += 1
+        self.created = self.created or timestamp
+        self.modified = timestamp
+        if created or original_values['data'] is None:
+            return created, (signals.source_created, self, {})
+        elif self.deleted:
+            return created, (signals.source_deleted, self, {})
+        else:
+            return created, (signals.source_changed, self, {'old_data': original_values['data']})
+
+    def save(self, *args, **kwargs):
+        cascade_to_resource = kwargs.pop('cascade_to_resource', True)
+        created, pending_signal = self.prepare_save()
+
+        if pending_signal:
             super().save(*args, **kwargs)
-            if created or original_values['data'] is None:
-                signals.source_created.send(self)
-            elif self.deleted:
-                signals.source_deleted.send(self)
-            else:
-                signals.source_changed.send(self, old_data=original_values['data'])
+            signal, sender, signal_kwargs = pending_signal
+            signal.send(sender, **signal_kwargs)
             if cascade_to_resource:
                 del self.resource.cached_source_set
                 self.resource.save()
@@ -446,6 +641,38 @@ class Link(models.Model):
     target_href = models.CharField(max_length=MAX_HREF_LENGTH, db_index=True)
     type = models.ForeignKey(LinkType)
 
+    # Maximum number of source hrefs to query for at once
+    sync_batch_size = 1000
+
+    @classmethod
+    def sync(cls, links_by_source):
+        """
+        Brings the stored links for some resources into line with
+        links_by_source, a dict from source hrefs to sets of
+        (target_href, link_type_name) pairs. Only links that have been
+        added or removed are written, using one DELETE and one INSERT.
+        """
+        source_hrefs = sorted(links_by_source)
+        to_delete, existing = [], set()
+        for i in range(0, len(source_hrefs), cls.sync_batch_size):
+            rows = cls.objects.filter(source_id__in=source_hrefs[i:i+cls.sync_batch_size])
+            for pk, source_href, target_href, type_name in rows.values_list('id', 'source_id', 'target_href', 'type_id'):
+                key = (source_href, target_href, type_name)
+                # Duplicates are deleted too
+                if key in existing or (target_href, type_name) not in links_by_source[source_href]:
+                    to_delete.append(pk)
+                else:
+                    existing.add(key)
+        to_create = [cls(source_id=source_href, target_href=target_href, type_id=type_name)
+                     for source_href in source_hrefs
+                     for target_href, type_name in sorted(links_by_source[source_href])
+                     if (source_href, target_href, type_name) not in existing]
+        if to_delete:
+            cls.objects.filter(id__in=to_delete).delete()
+        if to_create:
+            cls.objects.bulk_create(to_create)
+        return len(to_delete), len(to_create)
+
 class Identifier(models.Model, StaleFieldsMixin):
     resource = models.ForeignKey(Resource, related_name='identifiers')
     scheme = models.CharField(max_length=1024)
@@ -467,6 +694,66 @@ class Identifier(models.Model, StaleFieldsMixin):
         signals.identifier_removed.send(self)
         super(Identifier, self).delete(*args, **kwargs)
 
+    # Maximum number of resource hrefs or values to query for at once
+    sync_batch_size = 1000
+
+    @classmethod
+    def sync(cls, resources):
+        """
+        Brings the stored identifiers for some resources into line with
+        their identifier_data, deleting and inserting only those that have
+        changed.
+
+        Raises DuplicatedIdentifier, before writing anything, if an
+        identifier would be assigned to two resources.
+        """
+        resources = sorted(resources, key=lambda r: r.href)
+        claimed_by = {}
+        for resource in resources:
+            for scheme, value in resource.identifier_data:
+                key = (scheme, str(value))
+                if key in claimed_by:
+                    raise exceptions.DuplicatedIdentifier(scheme, key[1], resource=resource)
+                claimed_by[key] = resource
+
+        hrefs = [resource.href for resource in resources]
+        to_delete, existing = set(), set()
+        for i in range(0, len(hrefs), cls.sync_batch_size):
+            rows = cls.objects.filter(resource_id__in=hrefs[i:i+cls.sync_batch_size])
+            for pk, resource_href, scheme, value in rows.values_list('id', 'resource_id', 'scheme', 'value'):
+                resource = claimed_by.get((scheme, value))
+                if resource is not None and resource.href == resource_href:
+                    existing.add((scheme, value))
+                else:
+                    to_delete.add(pk)
+        to_create = [key for key in claimed_by if key not in existing]
+
+        # Check whether anything else already has the identifiers we're
+        # about to assign. Rows we're about to delete don't count.
+        values_by_scheme = collections.defaultdict(list)
+        for scheme, value in to_create:
+            values_by_scheme[scheme].append(value)
+        for scheme, values in sorted(values_by_scheme.items()):
+            values.sort()
+            for i in range(0, len(values), cls.sync_batch_size):
+                rows = cls.objects.filter(scheme=scheme, value__in=values[i:i+cls.sync_batch_size])
+                for pk, value in rows.values_list('id', 'value'):
+                    if pk not in to_delete:
+                        raise exceptions.DuplicatedIdentifier(scheme, value,
+                                                              resource=claimed_by[(scheme, value)])
+
+        if to_delete:
+            cls.objects.filter(id__in=to_delete).delete()
+        if to_create:
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create([cls(resource=claimed_by[key], scheme=key[0], value=key[1])
+                                             for key in sorted(to_create)])
+            except IntegrityError as e:
+                # Someone else has assigned one of them since we checked
+                raise exceptions.DuplicatedIdentifier() from e
+        return len(to_delete), len(to_create)
+
 CHANGESET_STATE_CHOICES = (
     ('pending-approval', 'pending approval'),
     ('scheduled', 'scheduled'),
@@ -498,6 +785,10 @@ class Changeset(models.Model):
     
     @transaction.atomic
     def perform(self, multiple=False, object_cache=None):
+        """
+        Applies the changeset. Where errorHandling is 'ignore', returns a
+        MultipleErrors describing any updates that couldn't be applied.
+        """
         from . import changeset # to avoid a circular import
 
         if self.state in ('pending-approval', 'performed', 'failed'):
@@ -515,7 +806,7 @@ class Changeset(models.Model):
                                           object_cache=object_cache)
         try:
             with transaction.atomic():
-                updater.perform_updates(self.data)
+                result = updater.perform_updates(self.data)
         except Exception:
             self.state = 'failed'
             self.performed = now()
@@ -525,3 +816,67 @@ class Changeset(models.Model):
             self.state = 'performed'
             self.performed = now()
             self.save()
+            return result
+
+REGENERATION_JOB_STATE_CHOICES = (
+    ('pending', 'pending'),
+    ('running', 'running'),
+    ('paused', 'paused'),
+    ('cancelled', 'cancelled'),
+    ('finished', 'finished'),
+    ('failed', 'failed'),
+)
+
+class RegenerationJob(models.Model):
+    """
+    A regeneration of every resource, performed in chunks by the
+    run_regeneration_jobs management command.
+
+    Resources are walked in href order, and each chunk is committed along
+    with the href of its last resource, so that a job that's interrupted can
+    pick up where it left off.
+    """
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='requested_regeneration_job')
+    state = models.CharField(max_length=30, choices=REGENERATION_JOB_STATE_CHOICES, default='pending')
+
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    # Number of resources to regenerate in each transaction
+    chunk_size = models.PositiveIntegerField(default=1000)
+    # Seconds to wait between chunks, to leave room for other writers
+    delay = models.FloatField(default=0)
+
+    # The href of the last resource regenerated; the checkpoint
+    last_href = models.CharField(max_length=MAX_HREF_LENGTH, blank=True)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    modified = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    @classmethod
+    @transaction.atomic
+    def enqueue(cls, requested_by, **kwargs):
+        """
+        Creates a job, unless one is already waiting to run, in which case
+        that is returned instead, updated with any parameters (e.g.
+        chunk_size or delay) given.
+        """
+        try:
+            job = cls.objects.select_for_update().filter(state='pending').order_by('created')[0]
+        except IndexError:
+            kwargs.setdefault('chunk_size', REGENERATION_JOB_CHUNK_SIZE)
+            return cls.objects.create(requested_by=requested_by, **kwargs)
+        if kwargs:
+            for name, value in kwargs.items():
+                setattr(job, name, value)
+            job.save(update_fields=list(kwargs))
+        return job
+
+    def get_absolute_url(self):
+        return reverse('halld:regeneration-job-detail', args=[self.pk])
+
+    @property
+    def is_active(self):
+        return self.state in ('pending', 'running')
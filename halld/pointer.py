@@ -0,0 +1,171 @@
+"""
+JSON pointers (RFC 6901), tuned for the way inferences use them.
+
+Pointers are parsed once and interned, so that Pointer('/a/b') always
+returns the same object. Pointer.parse() skips interning, for pointers
+from untrusted input. Unlike jsonpointer, lookups that miss return a
+default rather than raising, which matters when probing several pointers
+that usually aren't there. Pointer.get() still raises JsonPointerException
+for callers that expect it.
+"""
+
+import re
+
+from jsonpointer import JsonPointerException
+
+__all__ = ['Pointer', 'MISSING', 'JsonPointerException']
+
+class _Missing(object):
+    def __repr__(self):
+        return 'MISSING'
+
+    def __bool__(self):
+        return False
+
+# Returned by Pointer.resolve() when there's nothing at the pointer
+MISSING = _Missing()
+
+# The default for get() when none is given, meaning it should raise
+_NO_DEFAULT = object()
+
+_array_index_re = re.compile(r'^(0|[1-9][0-9]*)$')
+_bad_escape_re = re.compile(r'~[^01]|~$')
+
+def _unescape(part):
+    return part.replace('~1', '/').replace('~0', '~')
+
+def _escape(part):
+    return part.replace('~', '~0').replace('/', '~1')
+
+def _step(container, part):
+    """
+    Returns the child of container named by part, or MISSING.
+    """
+    if isinstance(container, dict):
+        return container.get(part, MISSING)
+    elif isinstance(container, (list, tuple)):
+        if _array_index_re.match(part):
+            index = int(part)
+            if index < len(container):
+                return container[index]
+    return MISSING
+
+class Pointer(object):
+    __slots__ = ('path', 'parts')
+
+    _interned = {}
+
+    def __new__(cls, path):
+        if isinstance(path, Pointer):
+            return path
+        # jsonpointer.JsonPointer, or anything else with a path
+        path = getattr(path, 'path', path)
+        try:
+            return cls._interned[path]
+        except KeyError:
+            pass
+        self = cls._interned[path] = cls.parse(path)
+        return self
+
+    @classmethod
+    def parse(cls, path):
+        """
+        Returns a Pointer for path without interning it, for pointers that
+        come from outside (e.g. query parameters), which would otherwise be
+        kept forever.
+        """
+        try:
+            return cls._interned[path]
+        except KeyError:
+            pass
+        if path and not path.startswith('/'):
+            raise JsonPointerException("Location must start with /")
+        if _bad_escape_re.search(path):
+            raise JsonPointerException("Found invalid escape sequence")
+        self = object.__new__(cls)
+        self.path = path
+        self.parts = tuple(map(_unescape, path.split('/')[1:]))
+        return self
+
+    @classmethod
+    def from_parts(cls, parts):
+        return cls(''.join('/' + _escape(str(part)) for part in parts))
+
+    def __repr__(self):
+        return 'Pointer({!r})'.format(self.path)
+
+    def __str__(self):
+        return self.path
+
+    def __getnewargs__(self):
+        return (self.path,)
+
+    def __getstate__(self):
+        return None
+
+    def resolve(self, doc, default=MISSING):
+        """
+        Returns the value at this pointer in doc, or default if there isn't
+        one.
+        """
+        for part in self.parts:
+            doc = _step(doc, part)
+            if doc is MISSING:
+                return default
+        return doc
+
+    def get(self, doc, default=_NO_DEFAULT):
+        """
+        Like resolve(), but raises JsonPointerException if there's nothing
+        at this pointer and no default was given.
+        """
+        value = self.resolve(doc)
+        if value is MISSING:
+            if default is _NO_DEFAULT:
+                raise JsonPointerException("Nothing at {}".format(self.path))
+            return default
+        return value
+
+    def set(self, doc, value, new_container=dict):
+        """
+        Sets the value at this pointer in doc, replacing any missing (or
+        falsy) intermediate values with new_container(). Raises
+        JsonPointerException if that isn't possible, e.g. because it would
+        mean indexing into a string.
+        """
+        if not self.parts:
+            raise JsonPointerException("Cannot set root in place")
+        parent = self.resolve_parent(doc)
+        if parent is MISSING or not self._assign(parent, self.parts[-1], value):
+            for i in range(1, len(self.parts)):
+                prefix = Pointer.from_parts(self.parts[:i])
+                if not prefix.resolve(doc, None):
+                    prefix._assign_or_raise(prefix.resolve_parent(doc), prefix.parts[-1],
+                                            new_container())
+            self._assign_or_raise(self.resolve_parent(doc), self.parts[-1], value)
+
+    def resolve_parent(self, doc):
+        for part in self.parts[:-1]:
+            doc = _step(doc, part)
+            if doc is MISSING:
+                return MISSING
+        return doc
+
+    @staticmethod
+    def _assign(container, part, value):
+        if isinstance(container, dict):
+            container[part] = value
+        elif isinstance(container, list):
+            if part == '-':
+                container.append(value)
+            elif _array_index_re.match(part) and int(part) < len(container):
+                container[int(part)] = value
+            else:
+                return False
+        else:
+            return False
+        return True
+
+    def _assign_or_raise(self, container, part, value):
+        if not self._assign(container, part, value):
+            raise JsonPointerException("Can't set {}".format(self.path))
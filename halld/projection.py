@@ -0,0 +1,115 @@
+"""
+Sparse field selection for resource responses, with ?fields=.
+
+Fields are comma-separated, and are either top-level names or JSON
+pointers into the resource's data, e.g.
+
+    ?fields=title,eats,/identifier/snake,/eatenBy/title
+
+A link type's name also selects its defunct: and collection: forms.
+Pointers step into objects; where they meet an array they apply to each
+of its items, so /eatenBy/title gives the title of every eatenBy link.
+Links keep their hrefs, and every resource keeps its self link.
+
+Top-level names are pruned before links are expanded, so unselected links
+are never fetched, and the projection is passed on to add_derived_data()
+so that type definitions can skip work that won't be seen.
+"""
+
+from . import exceptions
+from .pointer import Pointer, JsonPointerException
+
+__all__ = ['Projection']
+
+# Kept whatever's asked for, as renderers rely on them
+ALWAYS_INCLUDED = frozenset(['self', '_extant'])
+
+# Kept in any object a pointer selects within
+ALWAYS_INCLUDED_NESTED = frozenset(['href'])
+
+LINK_PREFIXES = ('defunct:', 'collection:')
+
+def _base_name(name):
+    for prefix in LINK_PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+class Projection(object):
+    def __init__(self, fields):
+        # A tree of the selected parts of the data, with True for those
+        # selected whole
+        self.tree = {}
+        for field in fields:
+            field = field.strip()
+            if not field:
+                continue
+            if field.startswith('/'):
+                try:
+                    parts = Pointer.parse(field).parts
+                except JsonPointerException as e:
+                    raise exceptions.InvalidParameter('fields', str(e))
+            else:
+                parts = (field,)
+            parts = (_base_name(parts[0]),) + parts[1:]
+            self._add(parts)
+
+    def _add(self, parts):
+        node = self.tree
+        for part in parts[:-1]:
+            if node.get(part) is True:
+                return
+            node = node.setdefault(part, {})
+        node[parts[-1]] = True
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Returns the Projection asked for in request's query string, or None
+        if all fields should be included.
+        """
+        if 'fields' not in request.GET:
+            return None
+        return cls(field for value in request.GET.getlist('fields')
+                         for field in value.split(','))
+
+    def __repr__(self):
+        return 'Projection({!r})'.format(self.tree)
+
+    def includes(self, name):
+        """
+        Whether anything under the top-level name is selected.
+        """
+        return name in ALWAYS_INCLUDED or _base_name(name) in self.tree
+
+    def prune(self, data):
+        """
+        Removes unselected top-level names from data, in place.
+        """
+        for name in list(data):
+            if not self.includes(name):
+                del data[name]
+
+    def apply(self, data):
+        """
+        Returns just the selected parts of data.
+        """
+        projected = {}
+        for name, value in data.items():
+            if name in ALWAYS_INCLUDED:
+                projected[name] = value
+            elif _base_name(name) in self.tree:
+                projected[name] = self._apply(value, self.tree[_base_name(name)])
+        return projected
+
+    def _apply(self, value, tree):
+        if tree is True:
+            return value
+        if isinstance(value, list):
+            return [self._apply(item, tree) for item in value]
+        if isinstance(value, dict):
+            return {name: self._apply(item, tree.get(name, True))
+                    for name, item in value.items()
+                    if name in tree or name in ALWAYS_INCLUDED_NESTED}
+        # A pointer into something that isn't an object
+        return value
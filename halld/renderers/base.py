@@ -7,6 +7,7 @@ from rest_framework.renderers import BaseRenderer
 from .. import get_halld_config
 from halld import response_data
 from halld.util.cache import ObjectCache
+from halld.util.serializers import get_serializer
 
 class HALLDRenderer(BaseRenderer, metaclass=abc.ABCMeta):
     def render(self, data, media_type=None, renderer_context=None):
@@ -23,6 +24,7 @@ class HALLDRenderer(BaseRenderer, metaclass=abc.ABCMeta):
         response_data.ResourceTypeList: 'render_resource_type_list',
         response_data.ResourceType: 'render_resource_type',
         response_data.ByIdentifier: 'render_by_identifier',
+        response_data.RegenerationJob: 'render_regeneration_job',
         response_data.Error: 'render_error',
     }
 
@@ -33,6 +35,7 @@ class HALLDRenderer(BaseRenderer, metaclass=abc.ABCMeta):
     render_source = abc.abstractmethod(lambda source: None)
     render_resource_type_list = abc.abstractmethod(lambda resource_type_list: None)
     render_by_identifier = abc.abstractmethod(lambda by_identifier: None)
+    render_regeneration_job = abc.abstractmethod(lambda regeneration_job: None)
     render_error = abc.abstractmethod(lambda error: None)
 
     def render_response_data(self, data):
@@ -48,6 +51,7 @@ class HALLDRenderer(BaseRenderer, metaclass=abc.ABCMeta):
         self.object_cache = getattr(request, 'object_cache') or ObjectCache()
         self.user = request.user
         self.request = request
+        self.serializer = get_serializer(request)
 
     def url_param_replace(self, **kwargs):
         query = QueryDict(self.request.META['QUERY_STRING'], mutable=True)
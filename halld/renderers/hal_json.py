@@ -1,10 +1,10 @@
 import copy
-import json
 
 from django.core.urlresolvers import reverse
 
 from .base import HALLDRenderer
 from .. import exceptions
+from .. import models
 from .. import response_data
 
 class HALJSONRenderer(HALLDRenderer):
@@ -12,7 +12,7 @@ class HALJSONRenderer(HALLDRenderer):
     format = 'hal-json'
     
     def serialize_data(self, data):
-        return json.dumps(data, indent=2)
+        return self.serializer(data)
     
     def set_render_parameters(self, request):
         self.include_links = 'exclude_links' not in request.GET
@@ -21,14 +21,37 @@ class HALJSONRenderer(HALLDRenderer):
     def render_index(self, index):
         return {'_links': index['links']}
 
-    def render_resource_list(self, resource_list):
+    def render_stream(self, data, media_type=None, renderer_context=None):
+        """
+        Renders a ResourceList as an iterator of strings, serializing each
+        item as soon as it's built rather than holding the whole rendered
+        page. Call ResourceList.prefetch() first, so that errors can still
+        get an error response.
+        """
+        if not isinstance(data, response_data.ResourceList):
+            raise TypeError("Can only stream a ResourceList")
+        self.set_render_parameters(renderer_context['request'])
+        hal = self.render_resource_list(data, resource_data=iter(()))
+        del hal['_embedded']
+        yield '{"_embedded": {"item": ['
+        for i, item in enumerate(data.iter_resource_data()):
+            yield (',\n' if i else '\n') + self.serialize_data(self.resource_to_hal(item))
+        yield '\n]}'
+        rest = self.serialize_data(hal)
+        yield (', ' + rest[1:]) if hal else '}'
+
+    def render_resource_list(self, resource_list, resource_data=None):
         hal = {}
         if 'resource_type' in resource_list:
             hal.update(resource_list['resource_type'].get_type_properties())
 
+        if resource_data is None:
+            resource_data = resource_list.resource_data
         paginator, page = resource_list['paginator'], resource_list['page']
-        hal.update(self.paginated(paginator, page, self.resource_to_hal,
-                                  resource_list.resource_data))
+        if paginator is None:
+            hal.update(self.cursor_paginated(page, self.resource_to_hal, resource_data))
+        else:
+            hal.update(self.paginated(paginator, page, self.resource_to_hal, resource_data))
 
         if 'exclude_extant' in resource_list:
             if resource_list['exclude_extant']:
@@ -62,12 +85,19 @@ class HALJSONRenderer(HALLDRenderer):
 
     def render_by_identifier(self, by_identifier):
         hal = {}
+        if by_identifier.get('include_data'):
+            filtered_data = models.Resource.get_filtered_data_many(
+                {result['resource'] for result in by_identifier['results'].values() if result},
+                by_identifier['user'])
+        else:
+            filtered_data = {}
         for identifier, result in by_identifier['results'].items():
             if not result:
                 hal[identifier] = None
                 continue
 
             resource = response_data.Resource(resource=result['resource'],
+                                              filtered_data=filtered_data.pop(result['resource'].href, None),
                                               object_cache=by_identifier['object_cache'],
                                               user=by_identifier['user'],
                                               include_source_links=False)
@@ -86,6 +116,25 @@ class HALJSONRenderer(HALLDRenderer):
                 hal[identifier]['data'] = self.resource_to_hal(resource.data)
         return hal
 
+    def render_regeneration_job(self, regeneration_job):
+        job = regeneration_job['job']
+        return {
+            '_links': {
+                'self': {'href': job.get_absolute_url()},
+            },
+            'state': job.state,
+            'created': job.created.isoformat(),
+            'started': job.started.isoformat() if job.started else None,
+            'finished': job.finished.isoformat() if job.finished else None,
+            'chunkSize': job.chunk_size,
+            'delay': job.delay,
+            'total': job.total,
+            'processed': job.processed,
+            'modified': job.modified,
+            'lastHref': job.last_href or None,
+            'error': job.error or None,
+        }
+
     def render_error(self, error):
         return dict(error)
 
@@ -105,6 +154,8 @@ class HALJSONRenderer(HALLDRenderer):
                     embedded[link_name] = link_items
                 else:
                     links[link_name] = link_items
+            if 'collection:' + link_type.name in data:
+                links['collection:' + link_type.name] = data.pop('collection:' + link_type.name)
         for name in ('self', 'findSource', 'sourceList', 'describes'):
             if name in data:
                 links[name] = data.pop(name)
@@ -129,6 +180,25 @@ class HALJSONRenderer(HALLDRenderer):
         data = resource_type.get_type_properties()
         return data
 
+    def cursor_paginated(self, page, to_hal_func, objects=None):
+        links = {
+            'first': {'href': self.url_param_replace(cursor='')},
+        }
+        if page.has_next():
+            links['next'] = {'href': self.url_param_replace(cursor=page.next_cursor)}
+        hal = {
+            '_links': links,
+            '_embedded': {
+                'item': list(map(to_hal_func, objects or page.object_list))
+            },
+            'pageSize': page.per_page,
+        }
+        if page.count is not None:
+            hal['itemCount'] = page.count
+        else:
+            hal['estimatedItemCount'] = page.estimated_count
+        return hal
+
     def paginated(self, paginator, page, to_hal_func, objects=None):
         links = {
             'first': {'href': self.url_param_replace(page=1)},
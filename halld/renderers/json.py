@@ -1,14 +1,15 @@
 import copy
-import json
 
 from rest_framework.renderers import BaseRenderer
 
+from ..util import serializers
+
 class JSONRenderer(BaseRenderer):
     media_type = 'application/json'
     format = 'json'
     
     def render(self, data, media_type=None, renderer_context=None):
         if isinstance(data, (dict, list)):
-            return json.dumps(data, indent=2)
+            return serializers.dumps(data, (renderer_context or {}).get('request'))
         else:
             raise NotImplementedError
@@ -1,5 +1,3 @@
-import json
-
 from .base import HALLDRenderer
 
 class JSONLDRenderer(HALLDRenderer):
@@ -8,7 +6,7 @@ class JSONLDRenderer(HALLDRenderer):
     
     def serialize_data(self, data):
         data['@context'] = self.halld_config.jsonld_context
-        return json.dumps(data, indent=2)
+        return self.serializer(data)
 
     def render_list(self, data):
         return {"item": map(self.render_data, data)}
@@ -38,5 +36,8 @@ class JSONLDRenderer(HALLDRenderer):
     def render_by_identifier(self, by_identifier):
         pass
 
+    def render_regeneration_job(self, regeneration_job):
+        pass
+
     def render_error(self, error):
         pass
\ No newline at end of file
@@ -29,34 +29,90 @@ class Index(ResponseData):
 class ResourceList(ResponseData):
     property_keys = {'resource_data'}
 
+    @cached_property
+    def resources(self):
+        return list(self['page'].object_list)
+
+    @cached_property
+    def filtered_data(self):
+        from .models import Resource as ResourceModel
+        return ResourceModel.get_filtered_data_many(self.resources, self['user'])
+
+    def prefetch(self):
+        """
+        Fetches the page's resources and what the user can see of them,
+        raising PermissionDenied if there's one they can't. Streamed
+        responses call this first, as once they've started it's too late to
+        respond with an error.
+        """
+        self.filtered_data
+
     @cached_property
     def resource_data(self):
-        return (Resource(resource=resource,
-                         object_cache=self['object_cache'],
-                         include_source_links=False,
-                         user=self['user']).data for resource in self['page'].object_list)
+        return self.iter_resource_data()
+
+    def iter_resource_data(self):
+        """
+        Yields the data for each resource on the page, building each only
+        when it's asked for.
+        """
+        for resource in self.resources:
+            yield Resource(resource=resource,
+                           filtered_data=self.filtered_data[resource.href],
+                           object_cache=self['object_cache'],
+                           include_source_links=False,
+                           fields=self.get('fields'),
+                           user=self['user']).data
 
 class Resource(ResponseData):
     property_keys = {'data'}
 
     @cached_property
     def data(self):
-        from . import exceptions
+        from . import exceptions, models
         from halld.files.models import ResourceFile
         from halld.files.definitions.resources import FileResourceTypeDefinition
         resource_type = self['resource'].get_type()
-        data = self['resource'].get_filtered_data(self['user'])
+        data = self.get('filtered_data')
+        if data is None:
+            data = self['resource'].get_filtered_data(self['user'])
 
         data['_extant'] = self['resource'].extant
         data['self'] = {'href': self['resource'].href}
 
         link_names = set()
+        hub_links = data.pop('_hubLinks', ())
+        fields = self.get('fields')
+        if fields is not None:
+            # Before expanding links, so that unselected ones aren't fetched
+            fields.prune(data)
+            hub_links = [link_name for link_name in hub_links if fields.includes(link_name)]
         if self.get('include_links', True):
-            hrefs = set()
+            hrefs, summary_hrefs = set(), set()
             for link_type in self.halld_config.link_types.values():
                 link_items = data.get(link_type.name, [])
-                hrefs.update(l['href'] for l in link_items if l)
-            self['object_cache'].resource.get_many(hrefs)
+                if not link_type.include:
+                    continue
+                if link_type.inline_limit is not None and len(link_items) > link_type.inline_limit:
+                    data[link_type.name] = link_items = link_items[:link_type.inline_limit]
+                    data['collection:' + link_type.name] = {
+                        'href': self['resource'].href + '/link/' + link_type.name + '?page={page}',
+                        'templated': True,
+                    }
+                if link_type.embed:
+                    hrefs.update(l['href'] for l in link_items if l)
+                else:
+                    summary_hrefs.update(l['href'] for l in link_items if l)
+            # Non-embedded links only need a title and so on, which most
+            # resources store separately from their data.
+            link_summaries = models.Resource.get_link_summaries(summary_hrefs)
+            hrefs |= summary_hrefs - set(link_summaries)
+            other_resources = [r for r in self['object_cache'].resource.get_many(hrefs, ignore_missing=True) if r]
+            try:
+                other_filtered_data = models.Resource.get_filtered_data_many(other_resources, self['user'])
+            except PermissionDenied:
+                # Find out which one-by-one below
+                other_filtered_data = {}
 
             for link_type in self.halld_config.link_types.values():
                 link_items = data.pop(link_type.name, [])
@@ -65,14 +121,22 @@ class Resource(ResponseData):
                 for link_item in link_items:
                     if not link_item:
                         continue
-                    try:
-                        other_data = Resource(resource=self['object_cache'].resource.get(link_item['href']),
-                                              include_links=False,
-                                              include_source_links=False,
-                                              user=self['user'],
-                                              object_cache=self['object_cache']).data
-                    except (exceptions.NoSuchResource, PermissionDenied):
-                        continue
+                    link_summary = None if link_type.embed else link_summaries.get(link_item['href'])
+                    if link_summary:
+                        other_data = {'_extant': link_summary['extant']}
+                        for name in ('title', 'describes'):
+                            if name in link_summary:
+                                other_data[name] = link_summary[name]
+                    else:
+                        try:
+                            other_data = Resource(resource=self['object_cache'].resource.get(link_item['href']),
+                                                  filtered_data=other_filtered_data.pop(link_item['href'], None),
+                                                  include_links=False,
+                                                  include_source_links=False,
+                                                  user=self['user'],
+                                                  object_cache=self['object_cache']).data
+                        except (exceptions.NoSuchResource, PermissionDenied):
+                            continue
                     if link_type.embed:
                         link_item.update(other_data)
                     else:
@@ -99,11 +163,16 @@ class Resource(ResponseData):
             for link_name in link_names:
                 if isinstance(data.get(link_name), list):
                     data[link_name].sort(key=lambda link: link.get('title', ''))
+            for link_name in hub_links:
+                link_type = self.halld_config.link_types.get(link_name)
+                if link_type and link_type.include:
+                    data['collection:' + link_name] = {'href': self['resource'].href + '/link/' + link_name}
         else:
             for link_type in self.halld_config.link_types.values():
                 data.pop(link_type.name, None)
 
-        if isinstance(resource_type, FileResourceTypeDefinition):
+        if isinstance(resource_type, FileResourceTypeDefinition) and \
+                (fields is None or fields.includes('describes')):
             data['describes'] = {
                 'href': reverse('halld-files:file-detail',
                                 args=[self['resource'].type_id,
@@ -123,7 +192,10 @@ class Resource(ResponseData):
         resource_type.add_derived_data(resource=self['resource'],
                                        data=data,
                                        object_cache=self['object_cache'],
-                                       user=self['user'])
+                                       user=self['user'],
+                                       fields=fields)
+        if fields is not None:
+            data = fields.apply(data)
         return data
 
 class SourceList(ResponseData):
@@ -150,5 +222,8 @@ class ResourceType(ResponseData):
 class ByIdentifier(ResponseData):
     pass
 
+class RegenerationJob(ResponseData):
+    pass
+
 class Error(ResponseData):
     pass
@@ -1,4 +1,5 @@
 from django.core.signals import Signal
+from django.db import transaction
 
 resource_created = Signal()
 resource_changed = Signal(['old_data'])
@@ -13,4 +14,21 @@ source_deleted = Signal()
 
 identifier_added = Signal()
 identifier_changed = Signal(['old_value'])
-identifier_removed = Signal()
\ No newline at end of file
+identifier_removed = Signal()
+
+def send_after_commit(pending_signals):
+    """
+    Sends each of a list of (signal, sender, kwargs) triples once the current
+    transaction has been committed, or straight away if this version of Django
+    doesn't support on-commit hooks.
+    """
+    def send():
+        for signal, sender, kwargs in pending_signals:
+            signal.send(sender, **kwargs)
+    if not pending_signals:
+        return
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit:
+        on_commit(send)
+    else:
+        send()
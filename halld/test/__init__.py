@@ -8,6 +8,7 @@ from .identifiers import *
 from .index import *
 from .inference import *
 from .link_normalization import *
+from .pointer import *
 from .resource import *
 from .resource_creation import *
 from .sources import *
@@ -4,7 +4,8 @@ import django.test
 
 from rest_framework.test import APIRequestFactory, force_authenticate
 
-from ..models import Changeset, Link, Identifier, Source, Resource
+from ..changeset import SourceUpdater
+from ..models import Changeset, Link, Identifier, Source, Resource, filtered_data_lru
 from .. import views
 from ..util.cache import ObjectCache
 
@@ -12,6 +13,7 @@ class TestCase(django.test.TransactionTestCase):
     def setUp(self):
         super().setUp()
         cache.clear()
+        filtered_data_lru.clear()
         self.factory = APIRequestFactory()
         self.superuser = User.objects.create_superuser(username='superuser',
                                                        email='superuser@example.com',
@@ -44,3 +46,13 @@ class TestCase(django.test.TransactionTestCase):
         request.user = self.superuser
         response = self.source_detail_view(request, 'snake', identifier, source_type)
         return response, identifier, source_href
+
+    def put_source(self, identifier, data):
+        updater = SourceUpdater('http://testserver/', self.superuser)
+        updater.perform_updates({'updates': [{
+            'method': 'PUT',
+            'resourceHref': '/snake/' + identifier,
+            'sourceType': 'science',
+            'data': data,
+        }]})
+        return updater
@@ -1,10 +1,21 @@
 import http
+import io
 import json
 
-from .. import exceptions
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+import mock
+
+from .. import exceptions, views
+from ..changeset import SourceUpdater
+from ..changeset.jobs import RegenerationJobRunner
+from ..changeset.regeneration import ThreadRegenerator
+from ..models import Link, RegenerationJob, Resource, Source
 from .base import TestCase
 
 from ..test_site.definitions import SnakeResourceTypeDefinition
+from ..util.cache import ObjectCache
 
 class ChangesetTestCase(TestCase):
     def testAddingUnsupportedSource(self):
@@ -52,3 +63,339 @@ class ChangesetTestCase(TestCase):
         error_json = cm.exception.detail
         self.assertEqual(error_json['_links']['missingResources'],
                          [{'href': href}])
+
+class RegenerationModeTestCase(TestCase):
+    def perform_changeset(self, regeneration_mode, identifiers):
+        updates = [{
+            'method': 'PUT',
+            'resourceHref': '/snake/' + identifier,
+            'sourceType': 'science',
+            'data': {'title': identifier,
+                     'eats': '/snake/' + identifiers[i-1]},
+        } for i, identifier in enumerate(identifiers)]
+        updater = SourceUpdater('http://testserver/', self.superuser,
+                                regeneration_mode=regeneration_mode,
+                                regeneration_workers=2)
+        updater.perform_updates({'updates': updates})
+        return {r.identifier: r.data for r in Resource.objects.all()}
+
+    @mock.patch.object(ThreadRegenerator, 'min_batch_size', 1)
+    def testThreadedMatchesSerial(self):
+        identifiers = [self.create_resource()[1] for i in range(4)]
+        serial_data = self.perform_changeset('serial', identifiers)
+        Source.objects.all().delete()
+        Resource.objects.all().update(data={}, version=0)
+        threaded_data = self.perform_changeset('thread', identifiers)
+        self.assertEqual(serial_data, threaded_data)
+        for identifier in identifiers:
+            self.assertEqual(threaded_data[identifier]['title'], identifier)
+
+    @mock.patch.object(ThreadRegenerator, 'min_batch_size', 1)
+    def testThreadedWithResourceCreatedInChangeset(self):
+        identifier_a = self.create_resource()[1]
+        with transaction.atomic():
+            # Not committed, so not visible to other connections
+            resource_b = Resource.create(self.superuser, 'snake')
+            updater = SourceUpdater('http://testserver/', self.superuser,
+                                    regeneration_mode='thread',
+                                    regeneration_workers=2)
+            with mock.patch.object(ObjectCache, 'snapshot', autospec=True,
+                                   side_effect=ObjectCache.snapshot) as snapshot:
+                updater.perform_updates({'updates': [{
+                    'method': 'PUT',
+                    'resourceHref': '/snake/' + identifier,
+                    'sourceType': 'science',
+                    'data': data,
+                } for identifier, data in [(identifier_a, {'title': 'Python',
+                                                           'eats': '/snake/' + resource_b.identifier}),
+                                           (resource_b.identifier, {'title': 'Mouse'})]]})
+            self.assertTrue(snapshot.called)
+        resource_a = Resource.objects.get(identifier=identifier_a)
+        resource_b = Resource.objects.get(href=resource_b.href)
+        self.assertEqual(resource_a.data['title'], 'Python')
+        self.assertEqual(resource_a.data['eats'][0]['href'], resource_b.href)
+        self.assertEqual(resource_b.data['title'], 'Mouse')
+        self.assertEqual(resource_b.data['eatenBy'][0]['href'], resource_a.href)
+
+class InputFingerprintTestCase(TestCase):
+    def testUnchangedCascadeSkipped(self):
+        _, python = self.create_resource()
+        _, cobra = self.create_resource()
+        self.put_source(python, {'title': 'Python'})
+        self.put_source(cobra, {'title': 'Cobra', 'eats': '/snake/' + python})
+        python_resource = Resource.objects.get(identifier=python)
+        self.assertTrue(python_resource.input_fingerprint)
+
+        with mock.patch.object(Resource, 'collect_data', autospec=True,
+                               side_effect=Resource.collect_data) as collect_data:
+            self.put_source(cobra, {'title': 'King cobra', 'eats': '/snake/' + python})
+        regenerated = set(call[0][0].identifier for call in collect_data.call_args_list)
+        self.assertEqual(regenerated, {cobra})
+        self.assertEqual(Resource.objects.get(identifier=cobra).data['title'], 'King cobra')
+        self.assertEqual(Resource.objects.get(identifier=python).version, python_resource.version)
+
+class BulkSaveTestCase(TestCase):
+    @mock.patch('halld.signals.source_changed')
+    @mock.patch('halld.signals.source_created')
+    def testVersionsAndSignals(self, source_created, source_changed):
+        identifiers = [self.create_resource()[1] for i in range(3)]
+        def put_sources(title):
+            updater = SourceUpdater('http://testserver/', self.superuser)
+            updater.perform_updates({'updates': [{
+                'method': 'PUT',
+                'resourceHref': '/snake/' + identifier,
+                'sourceType': 'science',
+                'data': {'title': title},
+            } for identifier in identifiers]})
+
+        put_sources('Snake')
+        self.assertEqual(source_created.send.call_count, 3)
+        self.assertEqual(set(Source.objects.values_list('version', flat=True)), {1})
+        versions = dict(Resource.objects.values_list('identifier', 'version'))
+
+        put_sources('Serpent')
+        self.assertEqual(source_changed.send.call_count, 3)
+        self.assertEqual(set(Source.objects.values_list('version', flat=True)), {2})
+        for resource in Resource.objects.all():
+            self.assertEqual(resource.data['title'], 'Serpent')
+            self.assertEqual(resource.version, versions[resource.identifier] + 1)
+            self.assertIsNotNone(resource.modified)
+
+class StreamingChangesetTestCase(TestCase):
+    def testPerUpdateErrors(self):
+        _, identifier = self.create_resource()
+        updates = [{
+            'id': 1,
+            'method': 'PUT',
+            'resourceHref': 'http://testserver/snake/' + identifier,
+            'sourceType': 'science',
+            'data': {'title': 'Snake'},
+        }, {
+            'id': 2,
+            'method': 'PUT',
+            'resourceHref': 'http://testserver/snake/' + identifier,
+            'sourceType': 'conjecture',
+            'data': {'wears': 'clothing'},
+        }]
+        request = self.factory.post('/changeset',
+                                    data='\n'.join(map(json.dumps, updates)) + '\n',
+                                    content_type='application/x-ndjson')
+        request.user = self.superuser
+        response = self.changeset_list_view(request)
+        self.assertEqual(response.status_code, http.client.OK)
+        lines = [json.loads(line.decode())
+                 for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[-1], {'processed': 2, 'applied': 1,
+                                     'failed': 1, 'done': True})
+        errors = lines[0]['_embedded']['error']
+        self.assertEqual([error['updateId'] for error in errors], [2])
+        self.assertEqual(errors[0]['error'], 'incompatible-source-type')
+
+        resource = Resource.objects.get(identifier=identifier)
+        self.assertEqual(resource.data['title'], 'Snake')
+
+    def post_stream(self, updates, path='/changeset'):
+        request = self.factory.post(path,
+                                    data='\n'.join(map(json.dumps, updates)) + '\n',
+                                    content_type='application/x-ndjson')
+        request.user = self.superuser
+        response = self.changeset_list_view(request)
+        return [json.loads(line.decode())
+                for line in b''.join(response.streaming_content).splitlines()]
+
+    def testChangesetLevelErrorsReportedPerUpdate(self):
+        _, identifier = self.create_resource()
+        missing_identifier = SnakeResourceTypeDefinition().generate_identifier()
+        lines = self.post_stream([{
+            'id': 1,
+            'method': 'PUT',
+            'resourceHref': 'http://testserver/snake/' + identifier,
+            'sourceType': 'science',
+            'data': {'title': 'Snake'},
+        }, {
+            'id': 2,
+            'method': 'PUT',
+            'resourceHref': 'http://testserver/snake/' + missing_identifier,
+            'sourceType': 'science',
+            'data': {'title': 'Ghost'},
+        }, {
+            'id': 3,
+            'method': 'PUT',
+            'resourceHref': 'http://testserver/snake/' + identifier,
+            'sourceType': 'nonexistent',
+            'data': {},
+        }])
+        self.assertEqual(lines[-1], {'processed': 3, 'applied': 1,
+                                     'failed': 2, 'done': True})
+        errors = lines[0]['_embedded']['error']
+        self.assertEqual([(error['updateId'], error['line'], error['error']) for error in errors],
+                         [(2, 2, 'source-data-without-resource'),
+                          (3, 3, 'no-such-source-type')])
+        self.assertEqual(Resource.objects.get(identifier=identifier).data['title'], 'Snake')
+
+    def testFailedChunkCountsEveryUpdate(self):
+        _, identifier = self.create_resource()
+        lines = self.post_stream([{
+            'id': 1,
+            'method': 'PUT',
+            'resourceHref': 'http://testserver/snake/' + identifier,
+            'sourceType': 'science',
+            'data': {'title': 'Snake'},
+        }, {
+            'id': 2,
+            'method': 'PUT',
+            'resourceHref': 'http://testserver/snake/' + identifier,
+            'sourceType': 'conjecture',
+            'data': {'wears': 'clothing'},
+        }], path='/changeset?errorHandling=try-all')
+        self.assertEqual(lines[-1], {'processed': 2, 'applied': 0,
+                                     'failed': 2, 'done': True})
+
+class RegenerationJobTestCase(TestCase):
+    def testRegenerateAllEnqueuesJob(self):
+        updater = SourceUpdater('http://testserver/', self.superuser)
+        updater.perform_updates({'regenerateAll': True})
+        self.assertEqual(updater.regeneration_job.state, 'pending')
+        # Asking again doesn't queue up a second job
+        updater = SourceUpdater('http://testserver/', self.superuser)
+        updater.perform_updates({'regenerateAll': True})
+        self.assertEqual(RegenerationJob.objects.count(), 1)
+
+    def testEnqueueUpdatesPendingJob(self):
+        view = views.RegenerateAllView.as_view()
+        responses = []
+        for chunk_size in (10, 20):
+            request = self.factory.post('/regenerate-all?chunkSize={}&delay=0.5'.format(chunk_size))
+            request.user = self.superuser
+            responses.append(view(request))
+        self.assertEqual(responses[1].status_code, http.client.ACCEPTED)
+        self.assertEqual(responses[0]['Location'], responses[1]['Location'])
+        job = RegenerationJob.objects.get()
+        self.assertEqual((job.chunk_size, job.delay), (20, 0.5))
+
+    def testResumesFromCheckpoint(self):
+        for i in range(5):
+            self.create_resource()
+        hrefs = sorted(Resource.objects.values_list('href', flat=True))
+        job = RegenerationJob.enqueue(self.superuser, chunk_size=2)
+
+        runner = RegenerationJobRunner(job)
+        self.assertTrue(runner.start())
+        self.assertTrue(runner.run_chunk())
+        self.assertEqual(runner.job.last_href, hrefs[1])
+
+        # As if the first runner had gone away
+        job = RegenerationJobRunner(RegenerationJob.objects.get(pk=job.pk)).run()
+        self.assertEqual(job.state, 'finished')
+        self.assertEqual(job.processed, 5)
+        self.assertEqual(job.total, 5)
+        self.assertEqual(job.last_href, hrefs[-1])
+
+    def testPaused(self):
+        self.create_resource()
+        job = RegenerationJob.enqueue(self.superuser)
+        RegenerationJob.objects.filter(pk=job.pk).update(state='paused')
+        job = RegenerationJobRunner(job).run()
+        self.assertEqual(job.state, 'paused')
+        self.assertEqual(job.processed, 0)
+
+    def testCommandContinuesAfterFailedJob(self):
+        self.create_resource()
+        failing = RegenerationJob.enqueue(self.superuser)
+        RegenerationJob.objects.filter(pk=failing.pk).update(state='running')
+        job = RegenerationJob.enqueue(self.superuser)
+
+        run_chunk = RegenerationJobRunner.run_chunk
+        def fail_first(runner):
+            if runner.job.pk == failing.pk:
+                raise Exception("boom")
+            return run_chunk(runner)
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch.object(RegenerationJobRunner, 'run_chunk', autospec=True, side_effect=fail_first):
+            with self.assertRaises(CommandError):
+                call_command('run_regeneration_jobs', stdout=stdout, stderr=stderr)
+        self.assertIn('Job {}: failed'.format(failing.pk), stderr.getvalue())
+        self.assertIn('boom', stderr.getvalue())
+        self.assertEqual(RegenerationJob.objects.get(pk=failing.pk).state, 'failed')
+        self.assertEqual(RegenerationJob.objects.get(pk=job.pk).state, 'finished')
+
+class LinkMaintenanceTestCase(TestCase):
+    def testUnchangedLinksKept(self):
+        identifier_a, identifier_b, identifier_c = [self.create_resource()[1] for i in range(3)]
+        self.put_source(identifier_a, {'eats': ['/snake/' + identifier_b]})
+        link = Link.objects.get()
+        self.assertEqual(link.target_href, 'http://testserver/snake/' + identifier_b)
+        # Inbound links pending in the same changeset are seen by the target
+        resource_b = Resource.objects.get(identifier=identifier_b)
+        self.assertEqual(resource_b.data['eatenBy'][0]['href'],
+                         'http://testserver/snake/' + identifier_a)
+
+        self.put_source(identifier_a, {'eats': ['/snake/' + identifier_b,
+                                                '/snake/' + identifier_c]})
+        self.assertEqual(Link.objects.count(), 2)
+        self.assertTrue(Link.objects.filter(pk=link.pk).exists())
+
+        self.put_source(identifier_a, {'eats': ['/snake/' + identifier_c]})
+        self.assertEqual(list(Link.objects.values_list('target_href', flat=True)),
+                         ['http://testserver/snake/' + identifier_c])
+
+class CascadeTestCase(TestCase):
+    def testUnchangedLinksDontCascade(self):
+        identifier_a, identifier_b = [self.create_resource()[1] for i in range(2)]
+        self.put_source(identifier_a, {'eats': ['/snake/' + identifier_b]})
+        version = Resource.objects.get(identifier=identifier_b).version
+
+        # Snakes don't look at the resources they're linked to, so B needn't
+        # be regenerated when only A's title changes.
+        updater = self.put_source(identifier_a, {'eats': ['/snake/' + identifier_b],
+                                                 'title': 'Python'})
+        self.assertEqual(updater.cascades_avoided, 1)
+        self.assertEqual(Resource.objects.get(identifier=identifier_b).version, version)
+
+        # But it is when the link goes away
+        self.put_source(identifier_a, {'title': 'Python'})
+        resource_b = Resource.objects.get(identifier=identifier_b)
+        self.assertNotIn('eatenBy', resource_b.data)
+
+    def testLinkedResourcesRegeneratedInOrder(self):
+        identifier_a, identifier_b = [self.create_resource()[1] for i in range(2)]
+        self.put_source(identifier_a, {'eats': ['/snake/' + identifier_b]})
+
+        # B is linked to from A, so waits for A to be regenerated
+        updater = SourceUpdater('http://testserver/', self.superuser)
+        updater.perform_updates({'updates': [{
+            'method': 'PUT',
+            'resourceHref': '/snake/' + identifier,
+            'sourceType': 'science',
+            'data': data,
+        } for identifier, data in [(identifier_a, {'eats': ['/snake/' + identifier_b],
+                                                   'title': 'Python'}),
+                                   (identifier_b, {'title': 'Mouse'})]]})
+        self.assertEqual(updater.cascade_stats['rounds'], 2)
+        self.assertEqual(updater.cascade_stats['deferred'], 1)
+        self.assertEqual(updater.cascade_stats['regenerations'], 2)
+
+class HubLinkTestCase(TestCase):
+    def testInboundLinksPastThresholdLeftOut(self):
+        hub = self.create_resource()[1]
+        members = [self.create_resource()[1] for i in range(4)]
+        for member in members[:2]:
+            self.put_source(member, {'memberOf': ['/snake/' + hub]})
+        self.assertEqual(len(Resource.objects.get(identifier=hub).data['hasMember']), 2)
+
+        self.put_source(members[2], {'memberOf': ['/snake/' + hub]})
+        resource = Resource.objects.get(identifier=hub)
+        self.assertNotIn('hasMember', resource.data)
+        self.assertEqual(resource.data['_hubLinks'], ['hasMember'])
+
+        # Once a hub, new members don't cause it to be regenerated
+        updater = self.put_source(members[3], {'memberOf': ['/snake/' + hub]})
+        self.assertEqual(Resource.objects.get(identifier=hub).version, resource.version)
+        self.assertEqual(updater.cascades_avoided, 1)
+
+        request = self.factory.get('/snake/' + hub + '/link/hasMember')
+        request.user = self.superuser
+        response = views.ResourceLinkListView.as_view()(request, 'snake', hub, 'hasMember')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['paginator'].count, 4)
@@ -4,10 +4,14 @@ import json
 import threading
 import unittest
 
+from django.db import OperationalError
 from django.test import skipUnlessDBFeature
+import mock
 from rest_framework.test import force_authenticate
 
+from ..changeset import SourceUpdater
 from ..models import Resource
+from ..util import locking
 from .base import TestCase
 
 class ExceptionInThread(Exception):
@@ -110,3 +114,43 @@ class ConcurrencyTestCase(TestCase):
         for resource in Resource.objects.all():
             self.assertIn('eats', resource.data)
             self.assertIn('eatenBy', resource.data)
+
+class LockRetryTestCase(TestCase):
+    def perform_updates(self, identifier, failures):
+        updater = SourceUpdater('http://testserver/', self.superuser)
+        regenerate_resources = updater.regenerate_resources
+        def flaky_regenerate_resources(*args, **kwargs):
+            nonlocal failures
+            if failures:
+                failures -= 1
+                raise OperationalError("deadlock detected")
+            return regenerate_resources(*args, **kwargs)
+        updater.regenerate_resources = flaky_regenerate_resources
+        with mock.patch('time.sleep') as sleep:
+            updater.perform_updates({'updates': [{
+                'resourceHref': '/snake/' + identifier,
+                'sourceType': 'science',
+                'method': 'PUT',
+                'data': {'title': 'Snake'},
+            }]})
+        return updater, sleep
+
+    def testRetriesWithBackoff(self):
+        _, identifier = self.create_resource()
+        updater, sleep = self.perform_updates(identifier, 2)
+        self.assertEqual(updater.lock_retries, 2)
+        self.assertEqual(updater.cascade_stats['lock_retries'], 2)
+        self.assertEqual(sleep.call_count, 2)
+        for (delay,), _ in sleep.call_args_list:
+            self.assertLessEqual(delay, updater.lock_retry_max_delay)
+        self.assertEqual(Resource.objects.get().data['title'], 'Snake')
+
+    def testGivesUp(self):
+        _, identifier = self.create_resource()
+        with self.assertRaises(OperationalError):
+            self.perform_updates(identifier, SourceUpdater.max_lock_retries + 1)
+
+    def testAdvisoryLockKey(self):
+        key = locking.advisory_lock_key('http://testserver/snake/abc')
+        self.assertEqual(key, locking.advisory_lock_key('http://testserver/snake/abc'))
+        self.assertTrue(-2**63 <= key < 2**63)
@@ -2,8 +2,10 @@ import copy
 import json
 
 from django.test import TestCase
+from jsonpointer import JsonPointerException
 
 from ..data import Data
+from ..pointer import MISSING
 
 class DataTestCase(TestCase):
     def testIdentifierGet(self):
@@ -31,3 +33,38 @@ class DataTestCase(TestCase):
                                'stableIdentifier': {'foo': 'bar'}},
                               sort_keys=True)
         self.assertEqual(actual, expected)
+
+    def testResolveMissing(self):
+        data = Data()
+        data['@source'] = {'science': {'a': 1}}
+        self.assertEqual(data.resolve('/@source/science/a', MISSING), 1)
+        self.assertIs(data.resolve('/@source/science/b', MISSING), MISSING)
+        self.assertIsNone(data.resolve('/@source/science/b', None))
+        with self.assertRaises(JsonPointerException):
+            data.resolve('/@source/science/b')
+
+class CopyOnWriteTestCase(TestCase):
+    def setUp(self):
+        self.source = {'name': {'first': 'Monty'}, 'eats': [{'href': '/snake/a'}]}
+        self.original = copy.deepcopy(self.source)
+        self.data = Data()
+        self.data['@source'] = self.data.own({'science': self.source})
+
+    def testSetCopiesShared(self):
+        self.data.set('/@source/science/name/last', 'Python')
+        self.assertEqual(self.source, self.original)
+        self.assertEqual(self.data.resolve('/@source/science/name'),
+                         {'first': 'Monty', 'last': 'Python'})
+
+    def testMutable(self):
+        self.data.set('/name', self.data.resolve('/@source/science/name'))
+        self.data.mutable('/name').update({'last': 'Python'})
+        self.assertEqual(self.source, self.original)
+        self.assertEqual(self.data['name'], {'first': 'Monty', 'last': 'Python'})
+
+    def testMaterialize(self):
+        self.data.set('/eats', self.data.resolve('/@source/science/eats'))
+        self.data.materialize(exclude=('@source',))
+        self.data['eats'][0]['href'] = 'http://example.org/snake/a'
+        self.assertEqual(self.source, self.original)
+        self.assertIs(self.data['@source']['science'], self.source)
@@ -51,3 +51,42 @@ class ByIdentifierViewTestCase(TestCase):
         self.assert_(id_two in response.data['results'])
         self.assert_('science' in response.data['results'][id_one]['sources'])
         self.assert_('science' in response.data['results'][id_two]['sources'])
+
+class IdentifierCacheTestCase(TestCase):
+    def testPrefetch(self):
+        from ..changeset.updater import IdentifierCache
+        identifiers = [self.create_resource()[1] for i in range(2)]
+        identifier_cache = IdentifierCache()
+        keys = [('snake', identifier) for identifier in identifiers] + [('snake', 'missing')]
+        with self.assertNumQueries(1):
+            identifier_cache.prefetch(keys)
+        with self.assertNumQueries(0):
+            for identifier in identifiers:
+                self.assertEqual(identifier_cache[('snake', identifier)],
+                                 'http://testserver/snake/' + identifier)
+            with self.assertRaises(models.Identifier.DoesNotExist):
+                identifier_cache[('snake', 'missing')]
+
+class IdentifierSyncTestCase(TestCase):
+    # Resources without sources aren't extant, so their identifiers come
+    # from stableIdentifier.
+    def testUnchangedIdentifiersKept(self):
+        _, identifier = self.create_resource()
+        resource = models.Resource.objects.get(identifier=identifier)
+        pks = set(models.Identifier.objects.filter(resource=resource).values_list('pk', flat=True))
+        self.assertEqual(models.Identifier.sync([resource]), (0, 0))
+        resource.data['stableIdentifier']['misc'] = 'bar'
+        self.assertEqual(models.Identifier.sync([resource]), (0, 1))
+        self.assertTrue(pks < set(models.Identifier.objects.filter(resource=resource).values_list('pk', flat=True)))
+
+    def testDuplicatedWithinBatch(self):
+        resources = []
+        for i in range(2):
+            _, identifier = self.create_resource()
+            resource = models.Resource.objects.get(identifier=identifier)
+            resource.data['stableIdentifier']['misc'] = 'bar'
+            resources.append(resource)
+        with self.assertRaises(exceptions.DuplicatedIdentifier) as cm:
+            models.Identifier.sync(resources)
+        self.assertEqual((cm.exception.scheme, cm.exception.value), ('misc', 'bar'))
+        self.assertFalse(models.Identifier.objects.filter(scheme='misc').exists())
@@ -49,3 +49,57 @@ class InferenceTestCase(TestCase):
         set_inference(resource, data)
         self.assertEqual(data.get('target'),
                          ['Cat', 'Dog', 'Horse', 'Mouse'])
+
+class InferencePlanTestCase(TestCase):
+    def testPlanCached(self):
+        from .. import get_halld_config
+        halld_config = get_halld_config()
+        resource_type = halld_config.resource_types['snake']
+        plan = resource_type.get_plan(['science', 'mythology'])
+        self.assertIs(plan, resource_type.get_plan(('science', 'mythology')))
+        self.assertEqual(plan.inferences,
+                         tuple(resource_type.inferences)
+                         + tuple(halld_config.source_types['science'].inferences)
+                         + tuple(halld_config.source_types['mythology'].inferences))
+        self.assertEqual(len(plan.normalizations), len(resource_type.get_normalizations()))
+        self.assertIsNot(plan, resource_type.get_plan(['science']))
+
+    def testFingerprintableOnlyIfDeclared(self):
+        from ..test_site.definitions import SnakeResourceTypeDefinition
+
+        class Clock(inference.Inference):
+            def __call__(self, resource, data, **kwargs):
+                data['now'] = 'now'
+
+        class ClockSnakeResourceTypeDefinition(SnakeResourceTypeDefinition):
+            def get_inferences(self):
+                return super().get_inferences() + [Clock()]
+
+        class SortedSnakeResourceTypeDefinition(SnakeResourceTypeDefinition):
+            def sort_links(self, resource, data, **kwargs):
+                pass
+
+        plan = SnakeResourceTypeDefinition().get_plan(['science'])
+        self.assertTrue(plan.fingerprintable)
+        self.assertFalse(ClockSnakeResourceTypeDefinition().get_plan(['science']).fingerprintable)
+        sorted_plan = SortedSnakeResourceTypeDefinition().get_plan(['science'])
+        self.assertFalse(sorted_plan.fingerprintable)
+        self.assertNotEqual(plan.normalization_names, sorted_plan.normalization_names)
+
+    def testLookupsDontReadLinkedData(self):
+        from ..test_site.definitions import SnakeResourceTypeDefinition
+
+        class LookupSnakeResourceTypeDefinition(SnakeResourceTypeDefinition):
+            def get_inferences(self):
+                return super().get_inferences() + [inference.Lookup('/eats', 'snake', '/@source/science/eats')]
+
+        class LinkedSnakeResourceTypeDefinition(LookupSnakeResourceTypeDefinition):
+            def add_inbound_links(self, resource, data, **kwargs):
+                pass
+
+        plan = LookupSnakeResourceTypeDefinition().get_plan(['science'])
+        self.assertTrue(plan.reads_linked_resources)
+        self.assertFalse(plan.reads_linked_data)
+        # Undeclared, so assumed to read anything
+        plan = LinkedSnakeResourceTypeDefinition().get_plan(['science'])
+        self.assertTrue(plan.reads_linked_data)
@@ -0,0 +1,42 @@
+import pickle
+
+from django.test import TestCase
+from jsonpointer import JsonPointerException
+
+from ..pointer import Pointer, MISSING
+
+class PointerTestCase(TestCase):
+    def testInterned(self):
+        self.assertIs(Pointer('/a/b'), Pointer('/a/b'))
+        self.assertIs(Pointer(Pointer('/a/b')), Pointer('/a/b'))
+        self.assertIs(pickle.loads(pickle.dumps(Pointer('/a/b'))), Pointer('/a/b'))
+
+    def testParseDoesNotIntern(self):
+        pointer = Pointer.parse('/not/interned')
+        self.assertEqual(pointer.parts, ('not', 'interned'))
+        self.assertNotIn('/not/interned', Pointer._interned)
+        self.assertIs(Pointer.parse('/a/b'), Pointer('/a/b'))
+
+    def testEscaping(self):
+        self.assertEqual(Pointer('/~0/~1/2').parts, ('~', '/', '2'))
+        self.assertEqual(Pointer.from_parts(['~', '/', 2]).path, '/~0/~1/2')
+        with self.assertRaises(JsonPointerException):
+            Pointer('a/b')
+
+    def testResolve(self):
+        doc = {'a': [{'b': 1}], 's': 'string'}
+        self.assertEqual(Pointer('/a/0/b').resolve(doc), 1)
+        for path in ('/a/1', '/a/-', '/a/01', '/c', '/s/0', '/a/0/b/c'):
+            self.assertIs(Pointer(path).resolve(doc), MISSING)
+        self.assertEqual(Pointer('/c').get(doc, None), None)
+        with self.assertRaises(JsonPointerException):
+            Pointer('/c').get(doc)
+
+    def testSet(self):
+        doc = {'list': [], 'falsy': 0, 's': 'string'}
+        Pointer('/a/b/c').set(doc, 1)
+        Pointer('/list/-').set(doc, 2)
+        Pointer('/falsy/d').set(doc, 3)
+        self.assertEqual(doc, {'a': {'b': {'c': 1}}, 'list': [2], 'falsy': {'d': 3}, 's': 'string'})
+        with self.assertRaises(JsonPointerException):
+            Pointer('/s/x').set(doc, 4)
@@ -1,10 +1,14 @@
+import http.client
 import json
 import unittest
 
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+import mock
 from rest_framework.test import force_authenticate
 
 from .base import TestCase
-from .. import models
+from .. import exceptions, models, views
 from .. import response_data
 
 class ResourceListTestCase(TestCase):
@@ -46,6 +50,24 @@ class ResourceListTestCase(TestCase):
                          self.extant_resource.href)
 
 
+    def testCursorPagination(self):
+        for i in range(3):
+            self.create_resource_and_source()
+        identifiers = sorted(models.Resource.objects.values_list('identifier', flat=True))
+
+        request = self.factory.get('/snake?cursor=&pageSize=2')
+        force_authenticate(request, self.anonymous_user)
+        page = self.resource_list_view(request, 'snake').data['page']
+        self.assertEqual([r.identifier for r in page.object_list], identifiers[:2])
+        self.assertTrue(page.has_next())
+
+        request = self.factory.get('/snake?pageSize=2&cursor=' + page.next_cursor)
+        force_authenticate(request, self.anonymous_user)
+        page = self.resource_list_view(request, 'snake').data['page']
+        self.assertEqual([r.identifier for r in page.object_list], identifiers[2:])
+        self.assertFalse(page.has_next())
+        self.assertEqual(page.count, 3)
+
 class ResourceDetailTestCase(TestCase):
     def testViewResource(self):
         resource = models.Resource.create(self.superuser, 'snake')
@@ -58,3 +80,250 @@ class ResourceDetailTestCase(TestCase):
         response = self.resource_detail_view(request, 'snake', resource.identifier)
         self.assertEqual(response.data.data.get('title'), 'Python')
 
+
+    def testInlineLimit(self):
+        members = [models.Resource.create(self.superuser, 'snake') for i in range(2)]
+        resource = models.Resource.create(self.superuser, 'snake')
+        resource.data = {'hasMember': [{'href': member.href, 'inbound': True}
+                                       for member in members]}
+        resource.save(regenerate=False)
+
+        request = self.factory.get('/snake/' + resource.identifier)
+        force_authenticate(request, self.superuser)
+        response = self.resource_detail_view(request, 'snake', resource.identifier)
+        data = response.data.data
+        self.assertEqual(len(data.get('hasMember', []) + data.get('defunct:hasMember', [])), 1)
+        self.assertEqual(data['collection:hasMember'],
+                         {'href': resource.href + '/link/hasMember?page={page}',
+                          'templated': True})
+
+    def testLinkSummary(self):
+        python = models.Resource.create(self.superuser, 'snake')
+        python.data = {'title': 'Python'}
+        python.save(regenerate=False)
+        self.assertEqual(python.link_summary, {'title': 'Python'})
+        summary = models.Resource.get_link_summaries([python.href])[python.href]
+        self.assertEqual(summary['title'], 'Python')
+        self.assertEqual(summary['version'], python.version)
+
+        cobra = models.Resource.create(self.superuser, 'snake')
+        cobra.data = {'eats': [{'href': python.href}]}
+        cobra.save(regenerate=False)
+
+        request = self.factory.get('/snake/' + cobra.identifier)
+        force_authenticate(request, self.superuser)
+        response = self.resource_detail_view(request, 'snake', cobra.identifier)
+        self.assertEqual(response.data.data['defunct:eats'][0]['title'], 'Python')
+        # Rendered from the summary, so python wasn't fetched
+        self.assertNotIn(python.href, response.data['object_cache'].resource.objs)
+
+    def testLinkSummaryPrivateIfFiltered(self):
+        from ..test_site.definitions import SnakeResourceTypeDefinition
+
+        class SecretSnakeResourceTypeDefinition(SnakeResourceTypeDefinition):
+            def get_filtered_data(self, resource, user, data):
+                raise PermissionDenied
+
+        self.assertTrue(SnakeResourceTypeDefinition().has_public_link_summary())
+        secret_snake = SecretSnakeResourceTypeDefinition()
+        self.assertFalse(secret_snake.has_public_link_summary())
+        self.assertIsNone(secret_snake.get_link_summary(None, {'title': 'Python'}))
+
+    def testRenderedResponseCached(self):
+        resource = models.Resource.create(self.superuser, 'snake')
+        resource.data = {'title': 'Python'}
+        resource.save(regenerate=False)
+
+        def get():
+            request = self.factory.get('/snake/' + resource.identifier,
+                                       HTTP_ACCEPT='application/hal+json')
+            force_authenticate(request, self.anonymous_user)
+            response = self.resource_detail_view(request, 'snake', resource.identifier)
+            return json.loads(response.content.decode())
+
+        self.assertEqual(get()['title'], 'Python')
+        with mock.patch.object(response_data.Resource, 'data',
+                               new_callable=mock.PropertyMock, side_effect=AssertionError):
+            self.assertEqual(get()['title'], 'Python')
+
+        # A new version means a new cache key
+        resource.data = {'title': 'Boa'}
+        resource.save(regenerate=False)
+        self.assertEqual(get()['title'], 'Boa')
+
+    def testRenderedResponseNotCachedIfLinkedTypeWontAllow(self):
+        from ..test_site.definitions import SnakeResourceTypeDefinition
+        python = models.Resource.create(self.superuser, 'snake')
+        python.data = {'title': 'Python'}
+        python.save(regenerate=False)
+        cobra = models.Resource.create(self.superuser, 'snake')
+        cobra.data = {'eats': [{'href': python.href}]}
+        cobra.save(regenerate=False)
+
+        request = self.factory.get('/snake/' + cobra.identifier, HTTP_ACCEPT='application/hal+json')
+        force_authenticate(request, self.anonymous_user)
+        # Allowed for cobra's own type, but not when checked again for the
+        # types it links to
+        with mock.patch.object(SnakeResourceTypeDefinition, 'cache_rendered_responses',
+                               side_effect=[True, False]):
+            response = self.resource_detail_view(request, 'snake', cobra.identifier)
+        self.assertEqual(response.status_code, http.client.OK)
+        self.assertNotIn('ETag', response)
+
+    def testNoSuchLinkType(self):
+        resource = models.Resource.create(self.superuser, 'snake')
+        request = self.factory.get('/snake/' + resource.identifier + '/link/noSuchLink')
+        force_authenticate(request, self.superuser)
+        with self.assertRaises(exceptions.NoSuchLinkType) as cm:
+            views.ResourceLinkListView.as_view()(request, 'snake', resource.identifier, 'noSuchLink')
+        self.assertEqual(cm.exception.detail['linkType'], ['noSuchLink'])
+
+    def testCompactUnlessPrettyAskedFor(self):
+        resource = models.Resource.create(self.superuser, 'snake')
+        resource.data = {'title': 'Python'}
+        resource.save(regenerate=False)
+
+        for path, accept, indented in [('', 'application/hal+json', False),
+                                       ('?pretty', 'application/hal+json', True),
+                                       ('', 'application/hal+json; profile=pretty', True)]:
+            request = self.factory.get('/snake/' + resource.identifier + path, HTTP_ACCEPT=accept)
+            force_authenticate(request, self.anonymous_user)
+            response = self.resource_detail_view(request, 'snake', resource.identifier)
+            self.assertEqual(b'\n  ' in response.content, indented)
+            self.assertEqual(json.loads(response.content.decode())['title'], 'Python')
+
+    def testConditionalGet(self):
+        resource = models.Resource.create(self.superuser, 'snake')
+        resource.data = {'title': 'Python'}
+        resource.save(regenerate=False)
+
+        def get(view, path, *args, **kwargs):
+            request = self.factory.get(path, HTTP_ACCEPT='application/hal+json', **kwargs)
+            force_authenticate(request, self.anonymous_user)
+            return view(request, *args)
+
+        for view, path, args in [(self.resource_detail_view, '/snake/' + resource.identifier, ('snake', resource.identifier)),
+                                 (self.resource_list_view, '/snake', ('snake',))]:
+            response = get(view, path, *args)
+            self.assertEqual(response.status_code, http.client.OK)
+            etag = response['ETag']
+            self.assertIn('Last-Modified', response)
+
+            with mock.patch.object(response_data.Resource, 'data',
+                                   new_callable=mock.PropertyMock, side_effect=AssertionError), \
+                    mock.patch.object(response_data.ResourceList, 'iter_resource_data',
+                                      side_effect=AssertionError):
+                response = get(view, path, *args, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, http.client.NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+
+            # Permissions are checked before deciding it's not modified
+            with mock.patch.object(models.Resource, 'get_filtered_data_many', side_effect=PermissionDenied):
+                response = get(view, path, *args, HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, http.client.FORBIDDEN)
+
+            response = get(view, path, *args, HTTP_IF_NONE_MATCH='"something-else"')
+            self.assertEqual(response.status_code, http.client.OK)
+
+        # A new version means a new ETag
+        response = get(self.resource_detail_view, '/snake/' + resource.identifier,
+                       'snake', resource.identifier)
+        resource.data = {'title': 'Boa'}
+        resource.save(regenerate=False)
+        response = get(self.resource_detail_view, '/snake/' + resource.identifier,
+                       'snake', resource.identifier, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, http.client.OK)
+
+    def testFieldProjection(self):
+        python = models.Resource.create(self.superuser, 'snake')
+        python.data = {'title': 'Python'}
+        python.save(regenerate=False)
+        cobra = models.Resource.create(self.superuser, 'snake')
+        cobra.data = {'title': 'Cobra',
+                      'identifier': {'snake': cobra.identifier, 'other': 'x'},
+                      'eats': [{'href': python.href}]}
+        cobra.save(regenerate=False)
+
+        request = self.factory.get('/snake/' + cobra.identifier + '?fields=title,/identifier/snake')
+        force_authenticate(request, self.superuser)
+        with mock.patch.object(models.Resource, 'get_link_summaries', return_value={}) as get_link_summaries:
+            response = self.resource_detail_view(request, 'snake', cobra.identifier)
+        # The eats link was pruned before links were looked up
+        get_link_summaries.assert_called_once_with(set())
+        data = response.data.data
+        self.assertEqual(data['title'], 'Cobra')
+        self.assertEqual(data['identifier'], {'snake': cobra.identifier})
+        self.assertEqual(data['self'], {'href': cobra.href})
+        for name in ('eats', 'defunct:eats', '_meta', 'sourceList'):
+            self.assertNotIn(name, data)
+        self.assertNotIn(python.href, response.data['object_cache'].resource.objs)
+
+        request = self.factory.get('/snake/' + cobra.identifier + '?fields=/eats/title')
+        force_authenticate(request, self.superuser)
+        data = self.resource_detail_view(request, 'snake', cobra.identifier).data.data
+        self.assertEqual(data['defunct:eats'], [{'href': python.href, 'title': 'Python'}])
+        self.assertNotIn('title', data)
+
+        request = self.factory.get('/snake/' + cobra.identifier + '?fields=/eats~2')
+        force_authenticate(request, self.superuser)
+        response = self.resource_detail_view(request, 'snake', cobra.identifier)
+        self.assertEqual(response.status_code, http.client.BAD_REQUEST)
+
+class FilteredDataTestCase(TestCase):
+    def testGetFilteredDataMany(self):
+        resources = [models.Resource.create(self.superuser, 'snake') for i in range(3)]
+        for i, resource in enumerate(resources):
+            resource.data = {'title': 'Snake {}'.format(i)}
+            resource.save(regenerate=False)
+
+        filtered_data = models.Resource.get_filtered_data_many(resources, self.superuser)
+        self.assertEqual({href: data['title'] for href, data in filtered_data.items()},
+                         {resource.href: resource.data['title'] for resource in resources})
+
+        # Now all served from the cache, in one go
+        models.filtered_data_lru.clear()
+        misses = models.filtered_data_stats['misses']
+        with mock.patch('halld.models.cache.get', side_effect=AssertionError):
+            filtered_data = models.Resource.get_filtered_data_many(resources, self.superuser)
+        self.assertEqual(models.filtered_data_stats['misses'], misses)
+        self.assertEqual(len(filtered_data), 3)
+
+    def testFilterClassesShareCacheEntries(self):
+        resource = models.Resource.create(self.superuser, 'snake')
+        resource.data = {'title': 'Python'}
+        resource.save(regenerate=False)
+        other_user = User.objects.create_user(username='other')
+
+        models.Resource.get_filtered_data_many([resource], self.superuser)
+        models.filtered_data_lru.clear()
+        # Snakes don't filter by user, so the other user gets the same entry
+        misses = models.filtered_data_stats['misses']
+        data = models.Resource.get_filtered_data_many([resource], other_user)
+        self.assertEqual(models.filtered_data_stats['misses'], misses)
+        self.assertEqual(data[resource.href]['title'], 'Python')
+
+        # And the in-process tier now has it
+        models.Resource.get_filtered_data_many([resource], other_user)
+        self.assertEqual(models.filtered_data_lru.hits, 1)
+
+class StreamingResourceListTestCase(TestCase):
+    def testStreamedHAL(self):
+        for i in range(3):
+            self.create_resource_and_source()
+        request = self.factory.get('/snake?pageSize=2', HTTP_ACCEPT='application/hal+json')
+        force_authenticate(request, self.anonymous_user)
+        response = self.resource_list_view(request, 'snake')
+        self.assertTrue(response.streaming)
+        hal = json.loads(b''.join(response.streaming_content).decode())
+        self.assertEqual(len(hal['_embedded']['item']), 2)
+        self.assertEqual(hal['itemCount'], 3)
+        self.assertIn('next', hal['_links'])
+
+    def testPermissionDeniedBeforeStreaming(self):
+        self.create_resource_and_source()
+        request = self.factory.get('/snake', HTTP_ACCEPT='application/hal+json')
+        force_authenticate(request, self.anonymous_user)
+        with mock.patch.object(models.Resource, 'get_filtered_data_many', side_effect=PermissionDenied):
+            response = self.resource_list_view(request, 'snake')
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.status_code, http.client.FORBIDDEN)
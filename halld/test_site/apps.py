@@ -17,6 +17,8 @@ class TestHALLDConfig(HALLDConfig):
         LinkTypeDefinition.new('eats', 'eatenBy'),
         LinkTypeDefinition.new('timelessF', 'timelessR', timeless=True),
         LinkTypeDefinition.new('functional', 'inverseFunctional', functional=True),
+        LinkTypeDefinition.new('memberOf', 'hasMember',
+                               inverse_hub_threshold=2, inverse_inline_limit=1),
     )
 
     source_type_classes = (
@@ -11,6 +11,9 @@ class SnakeResourceTypeDefinition(ResourceTypeDefinition):
 
     source_types = ['science', 'mythology']
 
+    # The built-in inferences only change data with data.set()
+    copy_on_write_sources = True
+
     def get_inferences(self):
         return [
             FirstOf('', '/@source/science', update=True),
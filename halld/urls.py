@@ -18,6 +18,9 @@ urlpatterns = patterns('',
     url(r'^regenerate-all$',
         views.RegenerateAllView.as_view(),
         name='regenerate-all'),
+    url(r'^regenerate-all/(?P<pk>\d+)$',
+        views.RegenerationJobDetailView.as_view(),
+        name='regeneration-job-detail'),
     url(r'^multi$',
         views.ResourceMultiView.as_view(),
         name='resource-multi'),
@@ -36,6 +39,10 @@ urlpatterns = patterns('',
         views.ResourceDetailView.as_view(),
         name='resource-detail'),
 
+    url(r'^(?P<resource_type>[a-z\-]+)/(?P<identifier>[a-z\-\d]+)/link/(?P<link_name>[a-zA-Z\d:\-]+)$',
+        views.ResourceLinkListView.as_view(),
+        name='resource-link-list'),
+
     url(r'^(?P<resource_type>[a-z\-]+)/(?P<identifier>[a-z\-\d]+)/source$',
         views.SourceListView.as_view(),
         name='source-list'),
@@ -0,0 +1,63 @@
+"""
+Multi-row writes, for when saving objects one at a time is too slow.
+
+Neither function here calls save() or sends any model signals.
+"""
+
+from django.db import connections, router
+from django.db.models.query import QuerySet
+
+def bulk_update(objs, fields=None, batch_size=500):
+    """
+    Writes the given fields (by default all of them) of objs, which must all
+    be of the same model, using as few UPDATE statements as the database
+    allows.
+    """
+    objs = list(objs)
+    if not objs:
+        return
+    model = type(objs[0])
+    if fields is None:
+        fields = [f for f in model._meta.local_concrete_fields if not f.primary_key]
+    else:
+        fields = [model._meta.get_field(name) for name in fields]
+
+    if hasattr(QuerySet, 'bulk_update'):
+        model.objects.bulk_update(objs, [f.name for f in fields], batch_size=batch_size)
+        return
+
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor == 'postgresql':
+        for i in range(0, len(objs), batch_size):
+            _postgresql_bulk_update(connection, model, objs[i:i+batch_size], fields)
+    else:
+        for obj in objs:
+            model.objects.filter(pk=obj.pk).update(**{f.name: getattr(obj, f.attname)
+                                                      for f in fields})
+
+def _postgresql_bulk_update(connection, model, objs, fields):
+    qn = connection.ops.quote_name
+    pk = model._meta.pk
+    columns = [pk] + fields
+    row = '({})'.format(', '.join('CAST(%s AS {})'.format(f.db_type(connection))
+                                  for f in columns))
+    sql = 'UPDATE {table} SET {assignments} FROM (VALUES {rows}) AS v ({columns}) WHERE {table}.{pk} = v.{pk}'.format(
+        table=qn(model._meta.db_table),
+        assignments=', '.join('{0} = v.{0}'.format(qn(f.column)) for f in fields),
+        rows=', '.join([row] * len(objs)),
+        columns=', '.join(qn(f.column) for f in columns),
+        pk=qn(pk.column))
+    params = [f.get_db_prep_save(getattr(obj, f.attname), connection)
+              for obj in objs for f in columns]
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, params)
+    finally:
+        cursor.close()
+
+def mark_saved(obj):
+    """
+    Resets stale field tracking for an object we've written without calling
+    save(), so that it no longer looks stale.
+    """
+    obj._original_state = obj._as_dict()
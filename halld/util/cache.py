@@ -6,16 +6,26 @@ from django.core.cache import cache
 from .. import exceptions
 from .. import models
 
+class PrefetchMiss(Exception):
+    """
+    Raised by read-only caches when asked for something they don't have.
+    """
+
 class BaseCache(object, metaclass=abc.ABCMeta):
     @abc.abstractproperty
     def Model(self): pass
 
+    # Read-only caches raise PrefetchMiss rather than querying
+    read_only = False
+
     def __init__(self, object_cache):
         self.objs = {}
         self.object_cache = object_cache
     
     def get_many(self, pks, ignore_missing=False):
         pks_to_fetch = set(pks) - set(self.objs)
+        if pks_to_fetch and self.read_only:
+            raise PrefetchMiss(self.Model.__name__, sorted(pks_to_fetch))
         if pks_to_fetch:
             objs = self.Model.objects.filter(href__in=pks_to_fetch)
             for obj in objs:
@@ -48,3 +58,15 @@ class ObjectCache(object):
     def __init__(self, user):
         self.source = SourceCache(self)
         self.resource = ResourceCache(self, user)
+
+    def snapshot(self):
+        """
+        Returns a read-only copy of this cache, for use from other threads
+        and processes, which mustn't query from outside our transaction.
+        """
+        snapshot = ObjectCache(None)
+        for name in ('source', 'resource'):
+            object_cache = getattr(snapshot, name)
+            object_cache.objs = dict(getattr(self, name).objs)
+            object_cache.read_only = True
+        return snapshot
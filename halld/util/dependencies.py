@@ -0,0 +1,24 @@
+"""
+Declaring what inferences and normalizations depend on. See
+halld.inference.Inference for what the declarations mean.
+"""
+
+def dependencies(reads_linked_resources=True, fingerprintable=False):
+    """
+    Decorator declaring the dependencies of an inference or normalization
+    that's a plain function (or method), with the same meanings as the
+    attributes of Inference.
+    """
+    def decorator(func):
+        func.reads_linked_resources = reads_linked_resources
+        func.fingerprintable = fingerprintable
+        return func
+    return decorator
+
+def reads_linked_resources(inference):
+    """
+    Whether an inference or normalization needs re-running when a resource
+    we link to (or that links to us) changes. Assumed to be the case unless
+    declared otherwise.
+    """
+    return getattr(inference, 'reads_linked_resources', True)
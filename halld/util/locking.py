@@ -0,0 +1,51 @@
+"""
+Locking sets of resources without deadlocking.
+
+Two transactions that lock overlapping sets of rows in different orders can
+deadlock, so everything here locks in a deterministic order: rows by href,
+and advisory locks by key.
+"""
+
+import hashlib
+
+from django.db import connections, router
+
+def advisory_lock_key(href):
+    """
+    Derives a signed 64-bit key for pg_advisory_xact_lock from an href.
+    """
+    return int.from_bytes(hashlib.sha1(href.encode()).digest()[:8], 'big', signed=True)
+
+def supports_advisory_locks(model):
+    return connections[router.db_for_write(model)].vendor == 'postgresql'
+
+def advisory_lock(model, hrefs):
+    """
+    Takes transaction-level PostgreSQL advisory locks for the given hrefs,
+    blocking until they're all held.
+    """
+    keys = sorted(set(map(advisory_lock_key, hrefs)))
+    if not keys:
+        return
+    cursor = connections[router.db_for_write(model)].cursor()
+    try:
+        cursor.execute('SELECT pg_advisory_xact_lock(k) FROM (SELECT unnest(%s::bigint[]) AS k ORDER BY k) AS keys',
+                       [keys])
+    finally:
+        cursor.close()
+
+def lock_rows(queryset, use_advisory_locks=False):
+    """
+    Returns a list of the objects in queryset (which must be of a model with
+    an href primary key), locked in href order.
+
+    With use_advisory_locks, advisory locks are taken on the objects' hrefs
+    instead of row locks. These only exclude other advisory lockers, so
+    should only be used where every writer uses them.
+    """
+    queryset = queryset.order_by('href')
+    if use_advisory_locks and supports_advisory_locks(queryset.model):
+        hrefs = list(queryset.values_list('href', flat=True))
+        advisory_lock(queryset.model, hrefs)
+        return list(queryset.filter(href__in=hrefs))
+    return list(queryset.select_for_update())
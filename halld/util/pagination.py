@@ -0,0 +1,80 @@
+"""
+Keyset ("cursor") pagination for resources.
+
+Paginator runs a COUNT(*) for every page, and an OFFSET query that gets
+slower the deeper the page. Here each page instead picks up after the
+(type, identifier) of the last resource on the previous one, which is
+indexed, and the total is an estimate from the query planner unless an
+exact count is asked for.
+"""
+
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
+
+from .. import exceptions
+
+def encode_cursor(resource):
+    key = json.dumps([resource.type_id, resource.identifier], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        type_id, identifier = json.loads(key.decode('utf-8'))
+        if not isinstance(type_id, str) or not isinstance(identifier, str):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise exceptions.InvalidParameter('cursor', 'Not a cursor from a previous page')
+    return type_id, identifier
+
+def estimate_count(queryset):
+    """
+    Returns the number of rows the database expects queryset to return,
+    or None if it can't say.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    cursor = connection.cursor()
+    try:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+class CursorPage(object):
+    """
+    A page of resources, with enough of Page's interface for ResourceList.
+    count is None unless exact_count was asked for, in which case
+    estimated_count is None instead.
+    """
+    def __init__(self, queryset, cursor, per_page, exact_count=False):
+        queryset = queryset.order_by('type_id', 'identifier')
+        self.cursor = cursor
+        self.per_page = per_page
+        if exact_count:
+            self.count, self.estimated_count = queryset.count(), None
+        else:
+            self.count, self.estimated_count = None, estimate_count(queryset)
+            if self.estimated_count is None:
+                self.count = queryset.count()
+        if cursor:
+            type_id, identifier = decode_cursor(cursor)
+            queryset = queryset.filter(Q(type_id__gt=type_id) |
+                                       Q(type_id=type_id, identifier__gt=identifier))
+        object_list = list(queryset[:per_page + 1])
+        self.object_list = object_list[:per_page]
+        if len(object_list) > per_page:
+            self.next_cursor = encode_cursor(self.object_list[-1])
+        else:
+            self.next_cursor = None
+
+    def has_next(self):
+        return self.next_cursor is not None
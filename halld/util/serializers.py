@@ -0,0 +1,53 @@
+"""
+Turning response data into JSON text.
+
+Responses are compact by default, using ujson. Pretty-printing (indented,
+with the standard library encoder) roughly doubles both the size of a
+response and the time taken to produce it, so is only used for browsers
+and for clients that ask for it with ?pretty or a 'pretty' profile
+parameter on the media type they accept, e.g.
+
+    Accept: application/hal+json; profile=pretty
+
+Other serializers can be added to SERIALIZERS and named with ?serializer=.
+"""
+
+import cgi
+import json
+
+import ujson
+
+def compact(data):
+    return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False)
+
+def pretty(data):
+    return json.dumps(data, indent=2)
+
+SERIALIZERS = {
+    'compact': compact,
+    'pretty': pretty,
+}
+
+def get_serializer(request=None):
+    """
+    Returns the serializer function to use for a response to request.
+    """
+    if request is None:
+        return compact
+    name = request.GET.get('serializer')
+    if name in SERIALIZERS:
+        return SERIALIZERS[name]
+    if 'pretty' in request.GET:
+        return pretty
+    media_type = getattr(request, 'accepted_media_type', None)
+    if media_type:
+        _, params = cgi.parse_header(media_type)
+        if params.get('profile') == 'pretty':
+            return pretty
+    # Someone looking at the response in a browser
+    if 'text/html' in request.META.get('HTTP_ACCEPT', ''):
+        return pretty
+    return compact
+
+def dumps(data, request=None):
+    return get_serializer(request)(data)
@@ -1,12 +1,16 @@
 import abc
 
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
 from rest_framework.views import APIView
 import rest_framework.renderers
 
 from ..util.cache import ObjectCache
+from ..util.pagination import CursorPage
 import halld.renderers
-from .. import get_halld_config
+from .. import exceptions, get_halld_config
+from ..conf import MAX_PAGE_SIZE
 
 class HALLDView(APIView, metaclass=abc.ABCMeta):
     renderer_classes = (
@@ -22,10 +26,51 @@ class HALLDView(APIView, metaclass=abc.ABCMeta):
         self.halld_config = get_halld_config()
 
 
+    default_page_size = 100
+
+    def get_page_size(self):
+        try:
+            page_size = int(self.request.GET['pageSize'])
+        except KeyError:
+            return self.default_page_size
+        except ValueError:
+            page_size = 0
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise exceptions.InvalidParameter('pageSize', 'Must be between 1 and {}'.format(MAX_PAGE_SIZE))
+        return page_size
+
     def get_paginator_and_page(self, objects):
-        paginator = Paginator(objects, 100)
+        paginator = Paginator(objects, self.get_page_size())
         try:
             page_num = int(self.request.GET.get('page'))
         except:
             page_num = 1
         return paginator, paginator.page(page_num)
+
+    def get_cursor_page(self, resources):
+        """
+        Returns a CursorPage of resources (a queryset) following the one
+        given in ?cursor=. The total is estimated unless ?count=exact.
+        """
+        return CursorPage(resources,
+                          cursor=self.request.GET.get('cursor'),
+                          per_page=self.get_page_size(),
+                          exact_count=self.request.GET.get('count') == 'exact')
+
+    def get_list_response(self, data):
+        """
+        Returns a response for a ResourceList, streamed if the renderer
+        chosen can do that.
+        """
+        renderer = self.request.accepted_renderer
+        if not hasattr(renderer, 'render_stream'):
+            return Response(data)
+        # Anything that'd mean an error response has to happen before the
+        # status line is sent; only serialization is left to the stream.
+        data.prefetch()
+        content_type = self.request.accepted_media_type
+        if renderer.charset:
+            content_type = '{}; charset={}'.format(content_type, renderer.charset)
+        return StreamingHttpResponse(renderer.render_stream(data, self.request.accepted_media_type,
+                                                            self.get_renderer_context()),
+                                     content_type=content_type)
@@ -1,10 +1,20 @@
+import cgi
 import http.client
+import itertools
+from urllib.parse import urljoin
 
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+import jsonschema
+from rest_framework.response import Response
+import ujson
 
 from .. import exceptions
 from .. import renderers
-from ..models import Changeset
+from .. import response_data
+from ..changeset import schema, SourceUpdater
+from ..models import Changeset, RegenerationJob, Resource
+from ..util.cache import ObjectCache
 from .base import HALLDView
 from .mixins import JSONRequestMixin
 
@@ -17,17 +27,208 @@ class ChangesetView(JSONRequestMixin, HALLDView):
                          data=data)
 
 class ChangesetListView(ChangesetView):
+    # Number of updates from a streamed changeset to apply at a time
+    stream_chunk_size = 500
+    update_schema = schema['properties']['updates']['items']
+
     def post(self, request):
+        content_type, _ = cgi.parse_header(request.META.get('CONTENT_TYPE', ''))
+        if content_type == 'application/x-ndjson':
+            return self.post_stream(request)
         data = self.get_request_json('application/json')
         changeset = self.get_new_changeset(data)
         changeset.perform(multiple=True,
                           object_cache=request.object_cache)
         return HttpResponse(status=http.client.NO_CONTENT)
 
+    def post_stream(self, request):
+        """
+        Accepts one update per line, applying them in chunks of
+        stream_chunk_size, each in its own transaction. Responds with a line
+        of progress after each chunk, including errors for the updates that
+        failed.
+
+        With errorHandling=ignore (the default) other updates in a chunk are
+        still applied when one fails; with errorHandling=try-all none of them
+        are.
+        """
+        if not request.user.is_authenticated():
+            raise exceptions.Forbidden(request.user)
+        error_handling = request.GET.get('errorHandling', 'ignore')
+        if error_handling not in ('ignore', 'try-all'):
+            raise exceptions.InvalidParameter()
+        lines = self.get_request_ndjson()
+        return StreamingHttpResponse(self.perform_stream(lines, error_handling),
+                                     content_type='application/x-ndjson')
+
+    def perform_stream(self, lines, error_handling):
+        processed, applied, failed = 0, 0, 0
+        while True:
+            chunk = list(itertools.islice(lines, self.stream_chunk_size))
+            if not chunk:
+                break
+            valid_lines, errors = [], []
+            for line_number, update in chunk:
+                if isinstance(update, exceptions.HALLDException):
+                    errors.append(update)
+                    continue
+                try:
+                    jsonschema.validate(update, self.update_schema)
+                except jsonschema.ValidationError as e:
+                    error = exceptions.SchemaValidationError(e)
+                    error.line = line_number
+                    if isinstance(update, dict):
+                        error.update_id = update.get('id')
+                    errors.append(error)
+                else:
+                    valid_lines.append((line_number, update))
+            # Anything that would fail the whole changeset is reported
+            # against the update that caused it, and left out.
+            updates = []
+            for line_number, update, error in self.check_stream_updates(valid_lines):
+                if error:
+                    error.line, error.update_id = line_number, update.get('id')
+                    errors.append(error)
+                else:
+                    updates.append(update)
+            failed += len(errors)
+
+            if updates:
+                changeset = self.get_new_changeset({'updates': updates,
+                                                    'errorHandling': error_handling,
+                                                    'description': 'Streamed changeset'})
+                try:
+                    result = changeset.perform(multiple=True,
+                                               object_cache=ObjectCache(self.request.user))
+                except exceptions.MultipleErrors as e:
+                    # Nothing in the chunk was applied
+                    errors.extend(e.errors)
+                    failed += len(updates)
+                except exceptions.HALLDException as e:
+                    errors.append(e)
+                    failed += len(updates)
+                else:
+                    update_errors = result.errors if result else []
+                    errors.extend(update_errors)
+                    failed += len(update_errors)
+                    applied += len(updates) - len(update_errors)
+
+            processed += len(chunk)
+            yield ujson.dumps({'processed': processed,
+                               'applied': applied,
+                               'failed': failed,
+                               '_embedded': {'error': [error.detail for error in errors]}}) + '\n'
+        yield ujson.dumps({'processed': processed,
+                           'applied': applied,
+                           'failed': failed,
+                           'done': True}) + '\n'
+
+    def check_stream_updates(self, lines):
+        """
+        Yields (line_number, update, error) for each of the given schema-valid
+        updates, with error being the exception that would otherwise fail
+        the whole of their changeset (a bad href, an unknown source type or a
+        missing resource), or None.
+        """
+        base_href = self.request.build_absolute_uri()
+        source_types = self.halld_config.source_types
+        checked = []
+        for line_number, update in lines:
+            if 'href' in update:
+                href = urljoin(base_href, update['href'])
+                match = SourceUpdater.source_href_re.match(href)
+                if not match:
+                    checked.append((line_number, update, None, exceptions.BadHrefs(href)))
+                    continue
+                resource_href, source_type = match.group('resource_href'), match.group('source_type')
+            else:
+                resource_href = urljoin(base_href, update['resourceHref'])
+                source_type = update['sourceType']
+            if source_type not in source_types:
+                checked.append((line_number, update, None, exceptions.NoSuchSourceType({source_type})))
+            else:
+                checked.append((line_number, update, resource_href, None))
+
+        resource_hrefs = {resource_href for _, _, resource_href, _ in checked if resource_href}
+        extant_hrefs = set(Resource.objects.filter(href__in=resource_hrefs)
+                                           .values_list('href', flat=True))
+        for line_number, update, resource_href, error in checked:
+            if resource_href and resource_href not in extant_hrefs:
+                error = exceptions.SourceDataWithoutResource(resource_href)
+            yield line_number, update, error
+
 class RegenerateAllView(ChangesetView):
+    """
+    Queues a job to regenerate all resources, responding with a link to its
+    progress. The job is run by the run_regeneration_jobs management command.
+    """
     def post(self, request):
-        changeset = self.get_new_changeset({'description': 'Regenerate all (POST)',
-                                            'regenerateAll': True})
-        changeset.perform(multiple=True,
-                          object_cache=request.object_cache)
-        return HttpResponse(status=http.client.NO_CONTENT)
+        if not request.user.is_superuser:
+            raise exceptions.CantRegenerateAll()
+        kwargs = {}
+        try:
+            if 'chunkSize' in request.GET:
+                kwargs['chunk_size'] = int(request.GET['chunkSize'])
+            if 'delay' in request.GET:
+                kwargs['delay'] = float(request.GET['delay'])
+        except ValueError as e:
+            raise exceptions.InvalidParameter() from e
+        if kwargs.get('chunk_size', 1) < 1 or kwargs.get('delay', 0) < 0:
+            raise exceptions.InvalidParameter()
+        job = RegenerationJob.enqueue(request.user, **kwargs)
+        return Response(response_data.RegenerationJob(job=job),
+                        status=http.client.ACCEPTED,
+                        headers={'Location': job.get_absolute_url()})
+
+class RegenerationJobDetailView(ChangesetView):
+    """
+    Reports on the progress of a regenerate-all job. POST
+    {"action": "pause"}, {"action": "resume"} or {"action": "cancel"} to
+    control it, optionally along with new chunkSize and delay values.
+    """
+    actions = {
+        # action: (from states, to state)
+        'pause': (('pending', 'running'), 'paused'),
+        'resume': (('paused', 'failed'), 'running'),
+        'cancel': (('pending', 'running', 'paused', 'failed'), 'cancelled'),
+    }
+
+    def get_job(self, pk, for_update=False):
+        jobs = RegenerationJob.objects.all()
+        if for_update:
+            jobs = jobs.select_for_update()
+        try:
+            return jobs.get(pk=pk)
+        except RegenerationJob.DoesNotExist as e:
+            raise Http404 from e
+
+    def get(self, request, pk):
+        return Response(response_data.RegenerationJob(job=self.get_job(pk)))
+
+    def post(self, request, pk):
+        if not request.user.is_superuser:
+            raise exceptions.CantRegenerateAll()
+        data = self.get_request_json('application/json')
+        with transaction.atomic():
+            job = self.get_job(pk, for_update=True)
+            if 'action' in data:
+                try:
+                    from_states, to_state = self.actions[data['action']]
+                except KeyError as e:
+                    raise exceptions.InvalidParameter() from e
+                if job.state not in from_states:
+                    raise exceptions.InvalidParameter()
+                if to_state == 'running' and not job.started:
+                    to_state = 'pending'
+                job.state = to_state
+            try:
+                if 'chunkSize' in data:
+                    job.chunk_size = int(data['chunkSize'])
+                if 'delay' in data:
+                    job.delay = float(data['delay'])
+            except (TypeError, ValueError) as e:
+                raise exceptions.InvalidParameter() from e
+            if job.chunk_size < 1 or job.delay < 0:
+                raise exceptions.InvalidParameter()
+            job.save()
+        return Response(response_data.RegenerationJob(job=job))
@@ -2,7 +2,6 @@ import collections
 import hashlib
 import json
 
-from rest_framework.response import Response
 from halld import response_data, renderers
 
 try:
@@ -12,6 +11,7 @@ except ImportError:
 
 from .base import HALLDView
 from .. import exceptions
+from ..models import Resource
 
 __all__ = ['GraphView']
 
@@ -63,19 +63,20 @@ class GraphView(HALLDView):
             resources.extend(new_resources)
             seen.update(start)
             start = set()
+            filtered_data = Resource.get_filtered_data_many(new_resources, request.user)
             for resource in new_resources:
                 resource.depth = i
-                resource_data = resource.get_filtered_data(request.user)
+                resource_data = filtered_data[resource.href]
                 for link in links:
                     for rel in resource_data.get(link, ()):
                         start.add(rel['href'])
 
         paginator, page = self.get_paginator_and_page(resources)
-        return Response(response_data.ResourceList(paginator=paginator,
-                                                   page=page,
-                                                   user=request.user,
-                                                   object_cache=request.object_cache,
-                                                   links=self.get_links(request)))
+        return self.get_list_response(response_data.ResourceList(paginator=paginator,
+                                                                 page=page,
+                                                                 user=request.user,
+                                                                 object_cache=request.object_cache,
+                                                                 links=self.get_links(request)))
 
     def get_links(self, request):
         return {
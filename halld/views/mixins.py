@@ -2,11 +2,18 @@ import cgi
 import codecs
 import datetime
 import email.utils
+import hashlib
 
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
 from django.views.generic import View
 import ujson
 
 from .. import exceptions
+from ..conf import RENDERED_RESPONSE_CACHE_TIMEOUT
+from ..renderers.base import HALLDRenderer
+from ..util.serializers import get_serializer
 
 class VersioningMixin(View):
     def check_version(self, obj):
@@ -21,8 +28,79 @@ class VersioningMixin(View):
                 raise HttpBadRequest
             return if_modified_since >= obj.modified
 
+    def get_not_modified_response(self, etag, last_modified=None):
+        """
+        Returns a 304 response if the request's If-None-Match (or, without
+        one, If-Modified-Since) shows the client already has the
+        representation with the given ETag and Last-Modified time, or None.
+        """
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            tags = {tag.strip() for tag in if_none_match.split(',')}
+            tags = {tag[2:] if tag.startswith('W/') else tag for tag in tags}
+            not_modified = '*' in tags or etag in tags
+        else:
+            since = parse_http_date_safe(self.request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            not_modified = (since is not None and last_modified is not None
+                            and int(last_modified.timestamp()) <= since)
+        if not_modified:
+            return self.set_version_headers(HttpResponseNotModified(), etag, last_modified)
+
+    def set_version_headers(self, response, etag, last_modified=None):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+class RenderedResponseCacheMixin(View):
+    """
+    Caches rendered responses, so that repeat requests skip both building
+    the response data and serializing it. Keys must cover everything that
+    went into the response; get_representation_key() adds the media type,
+    serializer and query string to whatever the view provides.
+    """
+    rendered_response_cache_timeout = RENDERED_RESPONSE_CACHE_TIMEOUT
+
+    def get_representation_key(self, *parts):
+        """
+        Returns a hash identifying the response to this request, or None if
+        there isn't one (e.g. it'll be rendered with an HTML template, which
+        may show more than the response data). Also used for ETags.
+        """
+        if not isinstance(self.request.accepted_renderer, HALLDRenderer):
+            return None
+        key = repr((self.request.accepted_media_type,
+                    get_serializer(self.request).__name__,
+                    sorted(self.request.GET.lists()),
+                    parts))
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get_cached_response(self, key):
+        if not self.rendered_response_cache_timeout:
+            return None
+        content = cache.get('rendered:' + key)
+        if content is not None:
+            return self.rendered_response(content)
+
+    def render_and_cache(self, key, data):
+        renderer = self.request.accepted_renderer
+        content = renderer.render(data, self.request.accepted_media_type,
+                                  self.get_renderer_context())
+        if isinstance(content, str):
+            content = content.encode(renderer.charset or 'utf-8')
+        if self.rendered_response_cache_timeout:
+            cache.set('rendered:' + key, content, self.rendered_response_cache_timeout)
+        return self.rendered_response(content)
+
+    def rendered_response(self, content):
+        renderer = self.request.accepted_renderer
+        content_type = self.request.accepted_media_type
+        if renderer.charset:
+            content_type = '{}; charset={}'.format(content_type, renderer.charset)
+        return HttpResponse(content, content_type=content_type)
+
 class JSONRequestMixin(View):
-    def get_request_json(self, expected_content_type='application/json'):
+    def get_request_reader(self, expected_content_type):
         try:
             content_type, options = cgi.parse_header(self.request.META['CONTENT_TYPE'])
         except KeyError:
@@ -34,9 +112,39 @@ class JSONRequestMixin(View):
             reader = codecs.getreader(charset)
         except LookupError:
             raise exceptions.UnsupportedRequestBodyEncoding()
+        return reader(self.request)
+
+    def get_request_json(self, expected_content_type='application/json'):
+        reader = self.get_request_reader(expected_content_type)
         try:
-            return ujson.load(reader(self.request))
+            return ujson.load(reader)
         except ValueError:
             raise exceptions.InvalidJSON()
         except UnicodeDecodeError:
             raise exceptions.InvalidEncoding()
+
+    def get_request_ndjson(self, expected_content_type='application/x-ndjson'):
+        """
+        Returns an iterator over (line number, value) pairs for a request body
+        with one JSON value per line, reading it as it goes. Lines that can't
+        be parsed produce an exception instance in place of a value.
+        """
+        reader = self.get_request_reader(expected_content_type)
+        def lines():
+            line_number = 0
+            try:
+                for line_number, line in enumerate(reader, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield line_number, ujson.loads(line)
+                    except ValueError:
+                        error = exceptions.InvalidJSON()
+                        error.line = line_number
+                        yield line_number, error
+            except UnicodeDecodeError:
+                error = exceptions.InvalidEncoding()
+                error.line = line_number + 1
+                yield line_number + 1, error
+        return lines()
@@ -2,17 +2,69 @@ import http.client
 
 from django.core.urlresolvers import reverse
 from django.db import transaction
+from django.db.models import Count, Max, Q
 from django.http import HttpResponse
 from rest_framework.response import Response
 
 from .base import HALLDView
-from ..models import Resource
+from .mixins import RenderedResponseCacheMixin, VersioningMixin
+from ..models import Link, Resource
 from .. import exceptions
+from ..projection import Projection
 from halld import response_data
 
-__all__ = ['ResourceListView', 'ResourceMultiView', 'ResourceDetailView']
+__all__ = ['ResourceListView', 'ResourceMultiView', 'ResourceDetailView', 'ResourceLinkListView']
+
+class ResourceListVersioningMixin(VersioningMixin, RenderedResponseCacheMixin):
+    """
+    Conditional GET for lists of resources. The ETag covers the versions of
+    the resources on the page, the number and last modification time of
+    the resources they link to or from (a linked resource that changes
+    becomes the most recently modified), the filter classes the user falls
+    into, and the pagination.
+    """
+    def get_conditional_list_response(self, data):
+        # Raises PermissionDenied before a 304 could be sent
+        data.prefetch()
+        key, last_modified = self.get_list_representation(data['paginator'], data['page'])
+        if key:
+            etag = '"{}"'.format(key)
+            response = self.get_not_modified_response(etag, last_modified)
+            if response:
+                return response
+        response = self.get_list_response(data)
+        if key:
+            self.set_version_headers(response, etag, last_modified)
+        return response
 
-class ResourceListView(HALLDView):
+    def get_list_representation(self, paginator, page):
+        object_list = page.object_list
+        if hasattr(object_list, 'values_list'):
+            items = list(object_list.values_list('href', 'version', 'type_id', 'modified'))
+        else:
+            items = [(r.href, r.version, r.type_id, r.modified) for r in object_list]
+        hrefs = [href for href, _, _, _ in items]
+        linked = Resource.objects.filter(Q(href__in=Link.objects.filter(source_id__in=hrefs).values('target_href')) |
+                                         Q(href__in=Link.objects.filter(target_href__in=hrefs).values('source_id')))
+        linked_summary = linked.aggregate(count=Count('href'), modified=Max('modified'))
+        type_ids = {type_id for _, _, type_id, _ in items}
+        type_ids.update(linked.values_list('type_id', flat=True).distinct())
+        resource_types = [self.halld_config.resource_types[type_id] for type_id in sorted(type_ids)]
+        if not all(resource_type.cache_rendered_responses() for resource_type in resource_types):
+            return None, None
+        filter_classes = [(resource_type.name, resource_type.get_filter_class(self.request.user))
+                          for resource_type in resource_types]
+        if paginator:
+            pagination = (paginator.count, page.number)
+        else:
+            pagination = (page.count, page.estimated_count, page.next_cursor)
+        key = self.get_representation_key([(href, version) for href, version, _, _ in items],
+                                          linked_summary['count'], linked_summary['modified'],
+                                          filter_classes, pagination)
+        modified = [m for m in [m for _, _, _, m in items] + [linked_summary['modified']] if m]
+        return key, max(modified) if modified else None
+
+class ResourceListView(HALLDView, ResourceListVersioningMixin):
     def initial(self, request, resource_type):
         super().initial(request, resource_type)
 
@@ -33,14 +85,18 @@ class ResourceListView(HALLDView):
             resources = resources.filter(extant=False)
         if self.exclude_defunct:
             resources = resources.filter(extant=True)
-        paginator, page = self.get_paginator_and_page(resources)
-        return Response(response_data.ResourceList(paginator=paginator,
-                                                   page=page,
-                                                   links=self.get_links(resource_type),
-                                                   exclude_extant=self.exclude_extant,
-                                                   exclude_defunct=self.exclude_defunct,
-                                                   user=request.user,
-                                                   object_cache=request.object_cache))
+        if 'cursor' in request.GET:
+            paginator, page = None, self.get_cursor_page(resources)
+        else:
+            paginator, page = self.get_paginator_and_page(resources)
+        return self.get_conditional_list_response(response_data.ResourceList(paginator=paginator,
+                                                                             page=page,
+                                                                             links=self.get_links(resource_type),
+                                                                             exclude_extant=self.exclude_extant,
+                                                                             exclude_defunct=self.exclude_defunct,
+                                                                             user=request.user,
+                                                                             fields=Projection.from_request(request),
+                                                                             object_cache=request.object_cache))
 
     @transaction.atomic
     def post(self, request, resource_type):
@@ -59,7 +115,7 @@ class ResourceListView(HALLDView):
                                'templated': True},
         }
 
-class ResourceMultiView(HALLDView):
+class ResourceMultiView(HALLDView, ResourceListVersioningMixin):
     def get_template_names(self):
         return ['halld/resource-list.html']
 
@@ -67,11 +123,12 @@ class ResourceMultiView(HALLDView):
         hrefs = map(request.build_absolute_uri, request.GET.getlist('href'))
         resources = Resource.objects.filter(href__in=hrefs)
         paginator, page = self.get_paginator_and_page(resources)
-        return Response(response_data.ResourceList(paginator=paginator,
-                                                   page=page,
-                                                   user=request.user,
-                                                   links=self.get_links(),
-                                                   object_cache=request.object_cache))
+        return self.get_conditional_list_response(response_data.ResourceList(paginator=paginator,
+                                                                             page=page,
+                                                                             user=request.user,
+                                                                             links=self.get_links(),
+                                                                             fields=Projection.from_request(request),
+                                                                             object_cache=request.object_cache))
 
     def get_links(self):
         return {
@@ -79,7 +136,7 @@ class ResourceMultiView(HALLDView):
                             'templated': True}
         }
 
-class ResourceDetailView(HALLDView):
+class ResourceDetailView(HALLDView, VersioningMixin, RenderedResponseCacheMixin):
     def initial(self, request, resource_type, identifier):
         super().initial(request, resource_type)
         try:
@@ -98,13 +155,60 @@ class ResourceDetailView(HALLDView):
         resource = request.object_cache.resource.get(self.href)
         if resource.deleted:
             raise exceptions.DeletedResource()
-        return Response(response_data.Resource({
+        # Raises PermissionDenied before anything's reused
+        filtered_data = resource.get_filtered_data(request.user)
+        key, last_modified = self.get_resource_representation(resource, filtered_data)
+        if key:
+            etag = '"{}"'.format(key)
+            response = self.get_not_modified_response(etag, last_modified) \
+                    or self.get_cached_response(key)
+            if response:
+                return self.set_version_headers(response, etag, last_modified)
+        data = response_data.Resource({
             'resource': resource,
-            'filtered_data': resource.get_filtered_data(request.user),
+            'filtered_data': filtered_data,
             'resource_type': resource_type,
             'user': request.user,
             'object_cache': request.object_cache,
-        }))
+            'fields': Projection.from_request(request),
+        })
+        if key:
+            return self.set_version_headers(self.render_and_cache(key, data), etag, last_modified)
+        return Response(data)
+
+    def get_resource_representation(self, resource, filtered_data):
+        """
+        Returns a key for the response, covering the versions of the
+        resource and those it links to in filtered_data (as included in the
+        response), and the filter classes the user falls into for each of
+        their types, along with when any of those resources last changed.
+        Returns (None, None) if responses for the resource shouldn't be
+        reused.
+        """
+        resource_type = resource.get_type()
+        if not resource_type.cache_rendered_responses():
+            return None, None
+        hrefs = set()
+        for link_type in self.halld_config.link_types.values():
+            if not link_type.include:
+                continue
+            link_items = filtered_data.get(link_type.name, ())
+            if link_type.inline_limit is not None:
+                link_items = link_items[:link_type.inline_limit]
+            hrefs.update(link_item['href'] for link_item in link_items if link_item)
+        linked = sorted(Resource.objects.filter(href__in=hrefs)
+                                        .values_list('href', 'version', 'type_id', 'modified'))
+        resource_types = {type_id: self.halld_config.resource_types[type_id]
+                          for type_id in {resource.type_id} | {type_id for _, _, type_id, _ in linked}}
+        if not all(linked_type.cache_rendered_responses() for linked_type in resource_types.values()):
+            return None, None
+        filter_classes = {type_id: linked_type.get_filter_class(self.request.user)
+                          for type_id, linked_type in resource_types.items()}
+        key = self.get_representation_key(resource.href, resource.version,
+                                          [(href, version) for href, version, _, _ in linked],
+                                          sorted(filter_classes.items()))
+        modified = [m for m in [resource.modified] + [m for _, _, _, m in linked] if m]
+        return key, max(modified) if modified else None
 
     @transaction.atomic
     def post(self, request, resource_type, identifier):
@@ -112,3 +216,40 @@ class ResourceDetailView(HALLDView):
         response = HttpResponse('', status=http.client.CREATED)
         response['Location'] = resource.href
         return response
+
+class ResourceLinkListView(ResourceDetailView):
+    """
+    The resources linked to or from a resource with a given link type, as a
+    paged list. Hub resources (see LinkTypeDefinition.hub_threshold) link
+    here instead of including their inbound links.
+    """
+    def initial(self, request, resource_type, identifier, link_name):
+        super().initial(request, resource_type, identifier)
+        try:
+            self.link_type = self.halld_config.link_types[link_name]
+        except KeyError:
+            raise exceptions.NoSuchLinkType([link_name])
+        if not self.link_type.include:
+            raise exceptions.NoSuchLinkType([link_name])
+
+    def get_template_names(self):
+        return ['halld/resource-list.html']
+
+    def get(self, request, resource_type, identifier, link_name):
+        resource = request.object_cache.resource.get(self.href)
+        if resource.deleted:
+            raise exceptions.NoSuchResource(resource.href)
+        # Inbound links are stored with the inverse link type
+        inbound = Link.objects.filter(target_href=resource.href,
+                                      type_id=self.link_type.inverse_name)
+        outbound = Link.objects.filter(source=resource,
+                                       type_id=self.link_type.name)
+        resources = Resource.objects.filter(Q(href__in=inbound.values('source_id')) |
+                                            Q(href__in=outbound.values('target_href'))).order_by('href')
+        paginator, page = self.get_paginator_and_page(resources)
+        return self.get_list_response(response_data.ResourceList(paginator=paginator,
+                                                                 page=page,
+                                                                 links={'up': {'href': resource.href}},
+                                                                 user=request.user,
+                                                                 fields=Projection.from_request(request),
+                                                                 object_cache=request.object_cache))